@@ -1,28 +1,55 @@
 import os
+import ast
+import time
+import contextvars
+import json5
+from typing import TypedDict, NotRequired, List, Optional
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor, wait
 from langchain_groq import ChatGroq
 from langchain.agents import AgentType
 from langchain.agents import initialize_agent, Tool
 from scrapper.google_scrapper import gsearch_pdf_links
 from scrapper.open_access import osearch_pdf_links
 from scrapper.web_scrapper import web_scrapper
-from utils.similarity import select_relevant_papers
+from utils.similarity import select_relevant_papers, rank_papers
+from utils.search_cache import cached_search
+from utils.doc_loader import prefetch_papers
+from utils.tracing import traced
 
 load_dotenv()
 
 API = os.getenv('GROQ')
 
+# Seconds the fast path waits for the scrapers, and whether the agent runs when it finds nothing
+FAST_SEARCH_DEADLINE = float(os.getenv('FAST_SEARCH_DEADLINE', '15'))
+PAPER_SEARCH_AGENT_FALLBACK = os.getenv('PAPER_SEARCH_AGENT_FALLBACK', 'true').lower() == 'true'
+
 llm = ChatGroq(
     api_key = API,
     model="meta-llama/llama-4-scout-17b-16e-instruct",
     temperature=0.1,  # adjust for creativity
 )
 
+google_search = traced("search.google")(cached_search("google")(gsearch_pdf_links))
+open_access_search = traced("search.open_access")(cached_search("open_access")(osearch_pdf_links))
+web_search = traced("search.web")(cached_search("web")(web_scrapper))
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="paper-search")
+
+
+class Paper(TypedDict):
+    title: str
+    pdf_link: str
+    # Runner-up candidates of the fast path, already being prefetched
+    alternatives: NotRequired[List["Paper"]]
+
+
 # --- Wrap scrapers as LangChain Tools ---
 tools = [
     Tool(
         name="GoogleScraper",
-        func = gsearch_pdf_links,
+        func = google_search,
         description=(
             "General-purpose API for searching research papers via Google. "
             "It can fetch a wide variety of research papers—including those not commonly indexed on popular platforms—"
@@ -31,7 +58,7 @@ tools = [
     ),
     Tool(
         name="OpenAccessScraper",
-        func = osearch_pdf_links,
+        func = open_access_search,
         description=(
             "Scrapes open-access research paper links from multiple niches. "
             "Use this to fetch academic papers from open-access sources (e.g., arXiv, PubMed, Semantic Scholar, OpenAlex). "
@@ -41,7 +68,7 @@ tools = [
     ),
     Tool(
         name="WebScrapper",
-        func = web_scrapper,
+        func = web_search,
         description=(
             "Use this tool to scrape research papers from Google Search when other sources are insufficient. "
             "It returns a list of paper metadata based on a user query. "
@@ -68,8 +95,95 @@ agent = initialize_agent(
     max_iterations=5,
 )
 
-# --- Paper Selector ---
-def select_paper(query: str) -> dict:
+# --- Fast path ---
+def _candidates(result) -> list:
+    if isinstance(result, dict) and result.get("status") == "success":
+        return result.get("data") or []
+    return []
+
+
+def _dedup(papers: list) -> list:
+    seen, unique = set(), []
+    for paper in papers:
+        if not paper.get("title") or not paper.get("pdf_link"):
+            continue
+        link = paper["pdf_link"].replace("/abs/", "/pdf/")
+        title = " ".join(paper["title"].lower().split())
+        if title in seen or link in seen:
+            continue
+        seen.update((title, link))
+        unique.append(paper)
+    return unique
+
+
+def search_candidates(query: str, deadline: float = FAST_SEARCH_DEADLINE) -> list:
+    """
+    Queries Google and the open-access sources concurrently and returns the
+    deduplicated candidates found within deadline seconds. The web scraper
+    is slow to wake up, so it only runs when both come back empty, within
+    what is left of the deadline.
+    """
+    start = time.monotonic()
+    # Each search runs in a copy of this context, so its span joins the caller's trace
+    futures = [
+        _executor.submit(contextvars.copy_context().run, search, query)
+        for search in (open_access_search, google_search)
+    ]
+    done, _ = wait(futures, timeout=deadline)
+
+    papers = []
+    for future in futures:
+        if future in done and future.exception() is None:
+            papers.extend(_candidates(future.result()))
+
+    remaining = deadline - (time.monotonic() - start)
+    if not papers and remaining > 0:
+        # Left running past the deadline, a late answer still lands in the search cache
+        future = _executor.submit(contextvars.copy_context().run, web_search, query)
+        done, _ = wait([future], timeout=remaining)
+        if future in done and future.exception() is None:
+            papers = _candidates(future.result())
+    return _dedup(papers)
+
+
+@traced("select_paper.fast")
+def fast_select_paper(query: str, owner: Optional[str] = None) -> Optional[Paper]:
+    """
+    Selects the best paper without any LLM call: scraper fan-out, dedup
+    and embedding ranking of the titles against the query. The ranked
+    candidates start downloading and indexing in the background right away,
+    on behalf of owner (the searching session).
+    """
+    ranked = rank_papers(query, search_candidates(query))
+    if not ranked:
+        return None
+
+    prefetch_papers([paper["pdf"] for paper in ranked], owner)
+    best, *rest = [Paper(title=paper["title"], pdf_link=paper["pdf"]) for paper in ranked]
+    best["alternatives"] = rest
+    return best
+
+
+# --- Agent fallback ---
+def _parse_agent_output(output: str) -> Optional[Paper]:
+    start, end = output.find("{"), output.rfind("}")
+    if start == -1 or end < start:
+        return None
+    try:
+        paper = json5.loads(output[start:end + 1])
+    except ValueError:
+        try:
+            paper = ast.literal_eval(output[start:end + 1])
+        except (ValueError, SyntaxError):
+            return None
+
+    if not isinstance(paper, dict) or not paper.get("pdf_link"):
+        return None
+    return Paper(title=paper.get("title") or paper["pdf_link"], pdf_link=paper["pdf_link"])
+
+
+@traced("select_paper.agent")
+def agent_select_paper(query: str) -> Optional[Paper]:
     """
     Full selection pipeline via agent:
     1. Agent scrapes papers.
@@ -79,7 +193,7 @@ def select_paper(query: str) -> dict:
     Args:
         query (str): Paper query/topic.
     Returns:
-        dict: Chosen paper metadata.
+        Paper: Chosen paper metadata, or None if the output had none.
     """
 
     prompt = f"""
@@ -118,4 +232,17 @@ def select_paper(query: str) -> dict:
     """
 
     result = agent.invoke(prompt)
-    return result['output']
+    return _parse_agent_output(result['output'])
+
+
+# --- Paper Selector ---
+@traced("select_paper")
+def select_paper(query: str, agent_fallback: bool = PAPER_SEARCH_AGENT_FALLBACK, owner: Optional[str] = None) -> Optional[Paper]:
+    """
+    Returns the best paper for the query, or None. Tries the fast path
+    first and only falls back to the agent when it finds nothing.
+    """
+    paper = fast_select_paper(query, owner)
+    if paper is None and agent_fallback:
+        paper = agent_select_paper(query)
+    return paper
@@ -0,0 +1,74 @@
+"""
+Throughput and retrieval agreement of the embedding backends against the
+default full-precision torch model.
+
+Agreement is the mean overlap of the top-k chunks each backend retrieves
+for the same queries, relative to the torch backend.
+
+    python -m benchmarks.bench_embedding --backends torch onnx onnx-int8 --batch-sizes 16 64
+"""
+import time
+import argparse
+import numpy as np
+from benchmarks.corpus import make_pdf
+from utils.doc_loader import parse_pdf
+from utils.embedding import build_model, BACKENDS
+
+QUERIES = [
+    "What datasets are used in the evaluation?",
+    "How are attention weights shared across layers?",
+    "Which metrics are reported?",
+    "What does the ablation study show?",
+    "How expensive is training in wall-clock time?",
+    "What is the main contribution of the paper?",
+]
+
+
+def top_k(doc_vectors, query_vectors, k):
+    docs = doc_vectors / np.linalg.norm(doc_vectors, axis=1, keepdims=True)
+    queries = query_vectors / np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    return np.argsort(-(queries @ docs.T), axis=1)[:, :k]
+
+
+def run(backend, batch_size, texts):
+    model = build_model(backend, batch_size)
+    model.embed_documents(texts[:batch_size])  # warm-up
+
+    start = time.perf_counter()
+    doc_vectors = np.array(model.embed_documents(texts))
+    elapsed = time.perf_counter() - start
+
+    query_vectors = np.array([model.embed_query(q) for q in QUERIES])
+    return len(texts) / elapsed, doc_vectors, query_vectors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[32])
+    parser.add_argument("--pages", type=int, default=60)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    chunks, _, _ = parse_pdf(make_pdf(args.pages, figures_per_page=0), "bench.pdf", workers=1)
+    texts = [chunk.page_content for chunk in chunks]
+    print(f"{len(texts)} chunks, {len(QUERIES)} queries, top-{args.k}")
+
+    reference = None
+    for batch_size in args.batch_sizes:
+        for backend in args.backends:
+            throughput, doc_vectors, query_vectors = run(backend, batch_size, texts)
+            hits = top_k(doc_vectors, query_vectors, args.k)
+            if reference is None:
+                reference = hits if backend == "torch" else None
+
+            agreement = "n/a"
+            if reference is not None:
+                overlap = [len(set(a) & set(b)) / args.k for a, b in zip(hits, reference)]
+                agreement = f"{np.mean(overlap):.2f}"
+
+            print(f"{backend:<10} batch={batch_size:<4} {throughput:8.1f} chunks/s  agreement@{args.k}={agreement}")
+
+
+if __name__ == "__main__":
+    main()
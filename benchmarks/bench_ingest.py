@@ -0,0 +1,99 @@
+"""
+Compares the legacy two-pass ingestion (temp file, PyMuPDFLoader, then a
+second fitz.open with get_text("dict") per image) against parse_pdf.
+
+Embedding is left out: both paths feed identical documents to FAISS.
+
+    python -m benchmarks.bench_ingest --pages 40 --figures 3
+"""
+import io
+import os
+import time
+import argparse
+import tempfile
+import fitz
+from PIL import Image
+from langchain_community.document_loaders import PyMuPDFLoader
+from benchmarks.corpus import make_pdf
+from utils.doc_loader import parse_pdf
+from utils.pdf_parser import split_documents
+
+
+def legacy_ingest(pdf_bytes):
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
+        tmp_file.write(pdf_bytes)
+        tmp_path = tmp_file.name
+
+    documents = split_documents(PyMuPDFLoader(tmp_path).load())
+
+    images_with_captions = []
+    doc = fitz.open(tmp_path)
+    for page in doc:
+        for img in page.get_images(full=True):
+            image_bytes = doc.extract_image(img[0])["image"]
+            image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".jpg")
+            image.save(temp_file, format="JPEG")
+            temp_file.close()
+
+            caption = None
+            for b in page.get_text("dict")["blocks"]:
+                if "lines" in b and b["type"] == 0:
+                    text = " ".join(span["text"] for line in b["lines"] for span in line["spans"])
+                    if "figure" in text.lower() or "fig." in text.lower():
+                        caption = text
+                        break
+
+            if caption:
+                images_with_captions.append([temp_file.name, caption])
+            else:
+                os.remove(temp_file.name)
+    doc.close()
+    os.remove(tmp_path)
+    return documents, images_with_captions
+
+
+def single_pass_ingest(pdf_bytes, workers=1):
+    chunks, figures, _ = parse_pdf(pdf_bytes, "bench.pdf", workers=workers)
+    return chunks, figures
+
+
+def best_of(fn, pdf_bytes, repeat, **kwargs):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks, figures = fn(pdf_bytes, **kwargs)
+        timings.append(time.perf_counter() - start)
+        # Legacy figures are temp JPEGs; parse_pdf only returns records into the PDF
+        for figure, _ in figures:
+            if isinstance(figure, str):
+                os.remove(figure)
+    return min(timings), len(chunks), len(figures)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--figures", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, nargs="*", default=[],
+                        help="also time parse_pdf with these process-pool sizes")
+    args = parser.parse_args()
+
+    pdf_bytes = make_pdf(args.pages, args.figures)
+    legacy = best_of(legacy_ingest, pdf_bytes, args.repeat)
+    single = best_of(single_pass_ingest, pdf_bytes, args.repeat)
+
+    print(f"{args.pages} pages, {args.figures} figures/page, {len(pdf_bytes) / 1e6:.1f} MB")
+    print(f"legacy       {legacy[0] * 1000:8.1f} ms  chunks={legacy[1]} figures={legacy[2]}")
+    print(f"single-pass  {single[0] * 1000:8.1f} ms  chunks={single[1]} figures={single[2]}")
+    print(f"speedup      {legacy[0] / single[0]:8.2f}x")
+
+    for workers in args.workers:
+        sharded = best_of(single_pass_ingest, pdf_bytes, args.repeat, workers=workers)
+        print(f"workers={workers:<3}  {sharded[0] * 1000:8.1f} ms  chunks={sharded[1]} figures={sharded[2]}"
+              f"  ({single[0] / sharded[0]:.2f}x vs 1 worker)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,418 @@
+"""
+Offline benchmark suite for the whole app: ingestion throughput, retrieval
+latency, search fan-out latency, paper loading, memory per session and
+end-to-end chat turn latency. Groq, the search APIs and the embedding
+model are replaced by the stand-ins in benchmarks/fakes.py, so runs are
+reproducible without network access or API keys.
+
+Results can be saved as a baseline and later runs compared against it;
+the comparison exits with status 1 when a metric regressed by more than
+--tolerance. benchmarks/data/baseline.json is the committed reference for
+--quick runs, which a bare --compare uses. Timings depend on the machine
+it records, so regenerate it on yours before comparing, and commit it
+again with changes that move a metric on purpose.
+
+    python -m benchmarks.bench_suite
+    python -m benchmarks.bench_suite --quick --save benchmarks/data/baseline.json
+    python -m benchmarks.bench_suite --quick --compare
+"""
+import io
+import gc
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import numpy as np
+import streamlit.logger
+from benchmarks.corpus import make_pdf
+from benchmarks.fakes import HashEmbeddings, FakeChatModel, SearchStubs
+
+# name -> (pages, figures per page)
+CORPUS = {
+    "small": (8, 1),
+    "medium": (40, 2),
+    "large": (120, 3),
+}
+QUICK_CORPUS = ("small", "medium")
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "baseline.json")
+
+QUERIES = [
+    "What datasets are used in the evaluation?",
+    "How are attention weights shared across layers?",
+    "Which metrics are reported?",
+    "What does the ablation study show?",
+    "How expensive is training in wall-clock time?",
+    "What does Figure 3.1 show?",
+    "Which optimizer and learning-rate schedule are used?",
+    "What are the limitations of the approach?",
+]
+SEARCH_QUERIES = [
+    "efficient attention transformers",
+    "graph neural networks for molecules",
+    "diffusion models image synthesis",
+    "retrieval augmented generation",
+    "federated learning privacy",
+    "protein structure prediction",
+]
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+def _p(values, q):
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def offline_env(workdir, stubs):
+    """
+    Points every cache and external URL at the sandbox. Must run before
+    the app modules are imported: they read their settings at import time.
+    """
+    os.environ.update(stubs.env())
+    os.environ.update({
+        "PAPER_CACHE_DIR": os.path.join(workdir, "papers"),
+        "LIBRARY_DIR": os.path.join(workdir, "library"),
+        "SEARCH_CACHE_PATH": os.path.join(workdir, "search.sqlite"),
+        "TRACE_ENABLED": "false",
+    })
+    os.environ.setdefault("GROQ", "offline")
+    os.environ.setdefault("API_KEY", "offline")
+    os.environ.setdefault("CSE_ID", "offline")
+    os.environ.setdefault("SYSTEM", "You answer questions about the research paper in the context.")
+    # Streamlit warns on every session_state access outside `streamlit run`
+    streamlit.logger.set_log_level("error")
+
+
+def install_embeddings(embeddings):
+    """
+    Swaps the embedding model for `embeddings`. Like offline_env, must run
+    before the app modules are imported: they bind load_model at import.
+    """
+    import utils.embedding
+    utils.embedding.load_model = lambda: embeddings
+
+
+# ------------------------ benchmarks ------------------------
+
+def bench_ingestion(corpus, embeddings, repeat):
+    from utils.doc_loader import parse_pdf, load_pdf
+
+    # Starts the parse pool and FAISS before anything is timed
+    load_pdf(*parse_pdf(next(iter(corpus.values())), "warmup.pdf"), 1)
+
+    metrics = {}
+    for name, pdf_bytes in corpus.items():
+        parse_times, index_times = [], []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            chunks, figures, paragraphs = parse_pdf(pdf_bytes, f"{name}.pdf")
+            parse_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            load_pdf(chunks, figures, paragraphs, CORPUS[name][0])
+            index_times.append(time.perf_counter() - start)
+
+        pages = CORPUS[name][0]
+        metrics[f"ingest.{name}.parse_ms"] = _ms(min(parse_times))
+        metrics[f"ingest.{name}.index_ms"] = _ms(min(index_times))
+        metrics[f"ingest.{name}.pages_per_s"] = round(pages / (min(parse_times) + min(index_times)), 1)
+    return metrics
+
+
+def bench_retrieval(handle, repeat):
+    from llm_engine import retrieve
+
+    latencies = []
+    for _ in range(repeat):
+        for query in QUERIES:
+            start = time.perf_counter()
+            retrieve(query, handle, handle.figures)
+            latencies.append(time.perf_counter() - start)
+    return {
+        "retrieve.p50_ms": _ms(_p(latencies, 50)),
+        "retrieve.p95_ms": _ms(_p(latencies, 95)),
+    }
+
+
+def bench_fanout(repeat):
+    from agent.ToolPapSe import search_candidates
+    from scrapper.open_access import fan_out
+
+    cold, warm, open_access = [], [], []
+    for round_ in range(repeat):
+        for query in SEARCH_QUERIES:
+            # A fresh query per round misses the search cache
+            query = f"{query} {round_}"
+            start = time.perf_counter()
+            fan_out(query)
+            open_access.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            search_candidates(query + " candidates")
+            cold.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            search_candidates(query + " candidates")
+            warm.append(time.perf_counter() - start)
+    return {
+        "search.open_access_p50_ms": _ms(_p(open_access, 50)),
+        "search.candidates_cold_p50_ms": _ms(_p(cold, 50)),
+        "search.candidates_cached_p50_ms": _ms(_p(warm, 50)),
+    }
+
+
+def bench_paper_load(stubs, pdf_index, pages):
+    """
+    Loading one paper by link three ways: nothing cached, held by another
+    session (shared store) and only on disk (paper cache).
+    """
+    from utils.doc_loader import download_pdf
+    from utils.paper_store import store
+
+    link = stubs.pdf_link(pdf_index)
+
+    start = time.perf_counter()
+    _, _, handle = download_pdf(link)
+    first = time.perf_counter() - start
+    handle.done.wait()
+    indexed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _, _, other = download_pdf(link)
+    shared = time.perf_counter() - start
+    other.release()
+
+    # Drop it from memory so the next load comes from the paper cache
+    max_bytes, store.max_bytes = store.max_bytes, 0
+    handle.release()
+    store.max_bytes = max_bytes
+
+    start = time.perf_counter()
+    _, _, handle = download_pdf(link)
+    disk = time.perf_counter() - start
+    handle.release()
+
+    return {
+        f"load.{pages}p.cold_first_ms": _ms(first),
+        f"load.{pages}p.cold_indexed_ms": _ms(indexed),
+        f"load.{pages}p.shared_ms": _ms(shared),
+        f"load.{pages}p.disk_cache_ms": _ms(disk),
+    }
+
+
+def _session(handle, llm, turns):
+    from utils.memory import RollingMemory
+
+    memory = RollingMemory(llm)
+    answer = " ".join(llm.answer)
+    for i in range(turns):
+        memory.save_context({"input": QUERIES[i % len(QUERIES)]}, {"output": answer})
+    return {"vectorstore": handle, "chat_memory": memory, "chat_history": [answer] * turns}
+
+
+def bench_sessions(sessions, pages, figures, llm, turns=6):
+    """
+    Memory per session. Python allocations a session adds on top of a paper
+    another session already opened (its store handle, chat memory and
+    history), traced with tracemalloc; and the store's own accounting of
+    what each distinct paper keeps resident. RSS deltas are too coarse for
+    either: the allocator reuses freed pages and FAISS allocates natively.
+    """
+    from utils.doc_loader import download_pdf
+    from utils.paper_store import store
+
+    def upload(seed):
+        file = io.BytesIO(make_pdf(pages, figures, seed=seed))
+        file.name = f"session-{seed}.pdf"
+        _, handle = download_pdf(file, False)
+        handle.done.wait()
+        return handle
+
+    # The first session imports the memory classes; only later ones are traced
+    base = _session(upload(1000), llm, turns)["vectorstore"]
+    tracemalloc.start()
+    try:
+        gc.collect()
+        before = tracemalloc.get_traced_memory()[0]
+        shared = [_session(upload(1000), llm, turns) for _ in range(sessions)]
+        gc.collect()
+        per_session = (tracemalloc.get_traced_memory()[0] - before) / sessions
+    finally:
+        tracemalloc.stop()
+
+    resident_before = store.stats()["resident_bytes"]
+    distinct = [upload(2000 + i) for i in range(sessions)]
+    per_paper = (store.stats()["resident_bytes"] - resident_before) / sessions
+
+    for session in shared:
+        session["vectorstore"].release()
+    for handle in distinct + [base]:
+        handle.release()
+    return {
+        "memory.session_kb": round(per_session / 1024, 1),
+        "memory.store_bytes_per_paper_kb": round(per_paper / 1024, 1),
+    }
+
+
+def bench_chat_turn(handle, llm, repeat):
+    """
+    The chat handler of myapp without the UI: retrieval, answer cache
+    lookup, prompt building, streaming the answer and saving the turn. A
+    second ask of each question is served from the answer cache.
+    """
+    import streamlit as st
+    from llm_engine import retrieve, build_messages
+    from utils.memory import RollingMemory
+    from utils.answer_cache import AnswerCache, context_fingerprint, replay
+
+    cache = AnswerCache()
+    ttft, total, cached = [], [], []
+    for round_ in range(repeat):
+        st.session_state.chat_memory = RollingMemory(llm)
+        st.session_state.sys_u = False
+        for query in QUERIES:
+            query = f"{query} ({round_})"
+            for attempt in range(2):
+                start = time.perf_counter()
+                retrieval = retrieve(query, handle, handle.figures)
+                fingerprint = context_fingerprint(retrieval["docs"])
+                cached_answer = cache.get(handle.key, fingerprint, retrieval["query_embedding"])
+                if cached_answer is None:
+                    tokens = (chunk.content or "" for chunk in llm.stream(build_messages(query, retrieval)))
+                else:
+                    tokens = replay(cached_answer)
+
+                answer, first = "", None
+                for token in tokens:
+                    if first is None:
+                        first = time.perf_counter() - start
+                    answer += token
+                if cached_answer is None:
+                    cache.put(handle.key, fingerprint, retrieval["query_embedding"], answer)
+                st.session_state.chat_memory.save_context({"input": query}, {"output": answer})
+                elapsed = time.perf_counter() - start
+
+                if attempt == 0:
+                    ttft.append(first)
+                    total.append(elapsed)
+                else:
+                    cached.append(elapsed)
+
+    # What the app adds on top of the model's own first-token latency
+    overhead = [t - llm.first_token_latency for t in ttft]
+    return {
+        "turn.ttft_p50_ms": _ms(_p(ttft, 50)),
+        "turn.overhead_p50_ms": _ms(_p(overhead, 50)),
+        "turn.total_p50_ms": _ms(_p(total, 50)),
+        "turn.cached_total_p50_ms": _ms(_p(cached, 50)),
+    }
+
+
+# ------------------------ baselines ------------------------
+
+def higher_is_better(name):
+    return name.endswith("_per_s")
+
+
+def compare(metrics, baseline, tolerance, noise_floor):
+    """
+    Prints current against baseline values; returns the regressed metric names.
+    Changes smaller than noise_floor (in the metric's own unit) are ignored.
+    """
+    regressions = []
+    print(f"\n{'metric':<40} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, value in metrics.items():
+        old = baseline.get(name)
+        if old is None:
+            print(f"{name:<40} {'-':>12} {value:>12} {'new':>8}")
+            continue
+        change = (value - old) / old if old else 0.0
+        worse = -change if higher_is_better(name) else change
+        flag = ""
+        if worse > tolerance and abs(value - old) > noise_floor:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<40} {old:>12} {value:>12} {change:>+8.0%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--quick", action="store_true", help="smaller corpus and fewer repeats")
+    parser.add_argument("--repeat", type=int, default=None)
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--token-rate", type=float, default=250.0, help="fake LLM tokens per second")
+    parser.add_argument("--first-token-ms", type=float, default=200.0, help="fake LLM time to first token")
+    parser.add_argument("--embeddings", choices=("hash", "model"), default="hash",
+                        help="hash: offline feature hashing; model: the configured embedding model")
+    parser.add_argument("--save", help="write the results to this baseline file")
+    parser.add_argument("--compare", nargs="?", const=BASELINE,
+                        help="compare against this baseline file, by default the committed one")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="relative slowdown counted as a regression")
+    parser.add_argument("--noise-floor", type=float, default=1.0)
+    args = parser.parse_args()
+
+    repeat = args.repeat or (2 if args.quick else 3)
+    names = QUICK_CORPUS if args.quick else tuple(CORPUS)
+    corpus = {name: make_pdf(*CORPUS[name]) for name in names}
+    llm = FakeChatModel(args.token_rate, args.first_token_ms / 1000)
+
+    with tempfile.TemporaryDirectory() as workdir, SearchStubs(list(corpus.values())) as stubs:
+        offline_env(workdir, stubs)
+        if args.embeddings == "hash":
+            embeddings = HashEmbeddings()
+            install_embeddings(embeddings)
+        else:
+            from utils.embedding import load_model
+            embeddings = load_model()
+
+        metrics = {}
+        metrics.update(bench_ingestion(corpus, embeddings, repeat))
+
+        # The largest paper of the run, loaded by link like a search result
+        largest = names[-1]
+        metrics.update(bench_paper_load(stubs, names.index(largest), CORPUS[largest][0]))
+
+        from utils.doc_loader import download_pdf
+        _, _, handle = download_pdf(stubs.pdf_link(names.index(largest)))
+        handle.done.wait()
+        metrics.update(bench_retrieval(handle, repeat * 5))
+        metrics.update(bench_chat_turn(handle, llm, repeat))
+        handle.release()
+
+        metrics.update(bench_fanout(repeat))
+        metrics.update(bench_sessions(args.sessions, *CORPUS["small"], llm))
+
+    for name, value in metrics.items():
+        print(f"{name:<40} {value:>12}")
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump({
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+                "config": vars(args),
+                "metrics": metrics,
+            }, f, indent=2)
+        print(f"\nsaved baseline to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("config", {}).get("quick") != args.quick:
+            print(f"\nnote: {args.compare} was saved with{'' if baseline.get('config', {}).get('quick') else 'out'} --quick")
+        regressions = compare(metrics, baseline["metrics"], args.tolerance, args.noise_floor)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+        print("\nno regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Offline recall@k of vector-only, BM25-only and hybrid (RRF) retrieval on a
+small labeled question set.
+
+The default question set targets exact terms (figure and section numbers)
+in the synthetic corpus. Evaluate a real paper with a question file of the
+form {"questions": [{"question": ..., "pages": [0-based page, ...]}]}:
+
+    python -m benchmarks.eval_retrieval
+    python -m benchmarks.eval_retrieval --pdf paper.pdf --questions paper_qa.json
+"""
+import os
+import json
+import time
+import argparse
+import numpy as np
+from benchmarks.corpus import make_pdf
+from utils.doc_loader import parse_pdf
+from utils.embedding import build_model
+from utils.paper_index import PaperIndex
+
+DEFAULT_QUESTIONS = os.path.join(os.path.dirname(__file__), "data", "retrieval_questions.json")
+
+
+def search(index, mode, question, k):
+    embedding = index.embeddings.embed_query(question)
+    if mode == "vector":
+        return [doc for doc, _ in index.similarity_search_with_score_by_vector(embedding, k=k)]
+    if mode == "bm25":
+        return [doc for doc, _ in index.lexical.search(question, k=k)]
+    return [doc for doc, _ in index.hybrid_search(question, embedding, k=k)]
+
+
+def evaluate(index, questions, mode, k):
+    hits, latencies = 0, []
+    for item in questions:
+        start = time.perf_counter()
+        docs = search(index, mode, item["question"], k)
+        latencies.append(time.perf_counter() - start)
+        if {doc.metadata["page"] for doc in docs} & set(item["pages"]):
+            hits += 1
+    return hits / len(questions), float(np.median(latencies))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", default=DEFAULT_QUESTIONS)
+    parser.add_argument("--pdf", help="evaluate on this PDF instead of the synthetic corpus")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 4])
+    args = parser.parse_args()
+
+    with open(args.questions) as f:
+        spec = json.load(f)
+
+    if args.pdf:
+        with open(args.pdf, "rb") as f:
+            pdf_bytes = f.read()
+    else:
+        pdf_bytes = make_pdf(**spec["corpus"])
+
+    chunks, _, paragraphs = parse_pdf(pdf_bytes, "eval.pdf", workers=1)
+    index = PaperIndex(build_model(), total_pages=0)
+    index.add_batch(chunks, [], 0, paragraphs)
+
+    print(f"{len(chunks)} chunks, {len(spec['questions'])} questions")
+    for k in args.k:
+        for mode in ("vector", "bm25", "hybrid"):
+            recall, latency = evaluate(index, spec["questions"], mode, k)
+            print(f"{mode:<7} recall@{k}={recall:.2f}  median latency {latency * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Offline stand-ins for the external services, so benchmarks measure this
+code and not the network: deterministic hashing embeddings, a streaming
+chat model with a configurable token rate, and one local HTTP server
+answering for every search source and serving PDFs from the corpus.
+"""
+import json
+import time
+import zlib
+import threading
+from collections import Counter
+import numpy as np
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage, AIMessageChunk
+from benchmarks.corpus import SENTENCES
+from utils.bm25 import tokenize
+
+
+class HashEmbeddings(Embeddings):
+    """
+    Bag-of-words feature hashing into `dim` buckets; no model download.
+    Retrieval quality is not representative, timings of everything around
+    the embedding call are.
+    """
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def _embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in tokenize(text):
+            vector[zlib.crc32(token.encode()) % self.dim] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+class FakeChatModel:
+    """
+    The part of the ChatGroq interface the app uses: stream() yields
+    AIMessageChunks at `tokens_per_second` after `first_token_latency`
+    seconds, invoke() returns the whole AIMessage after the same time.
+    """
+
+    def __init__(self, tokens_per_second=250.0, first_token_latency=0.2, answer_tokens=150, seed=0):
+        self.tokens_per_second = tokens_per_second
+        self.first_token_latency = first_token_latency
+        words = " ".join(np.random.default_rng(seed).choice(SENTENCES, size=answer_tokens)).split()
+        self.answer = words[:answer_tokens]
+        self.calls = 0
+
+    def stream(self, messages, **kwargs):
+        self.calls += 1
+        time.sleep(self.first_token_latency)
+        for i, word in enumerate(self.answer):
+            if i and self.tokens_per_second:
+                time.sleep(1.0 / self.tokens_per_second)
+            yield AIMessageChunk(content=word + " ")
+
+    def invoke(self, messages, **kwargs):
+        self.calls += 1
+        generation = len(self.answer) / self.tokens_per_second if self.tokens_per_second else 0.0
+        time.sleep(self.first_token_latency + generation)
+        return AIMessage(content=" ".join(self.answer))
+
+
+# Seconds each stubbed source takes to answer, roughly their real-world order
+DEFAULT_LATENCIES = {
+    "s2": 0.15,
+    "arxiv": 0.25,
+    "openalex": 0.2,
+    "springer": 0.35,
+    "google": 0.2,
+    "web": 0.8,
+    "pdf": 0.05,
+}
+
+
+class SearchStubs:
+    """
+    One ThreadingHTTPServer on 127.0.0.1 standing in for Semantic Scholar,
+    arXiv, OpenAlex, Springer, Google CSE and the web scraper, each under
+    its own path prefix, plus any path ending in .pdf, served from `pdfs`.
+    `statuses` makes a source answer with an HTTP error instead.
+    env() gives the URL overrides to set before the scrapers are imported.
+
+        with SearchStubs(pdfs) as stubs:
+            os.environ.update(stubs.env())
+    """
+
+    def __init__(self, pdfs, latencies=None, results_per_source=5):
+        self.pdfs = list(pdfs)
+        self.latencies = {**DEFAULT_LATENCIES, **(latencies or {})}
+        self.results_per_source = results_per_source
+        self.statuses = {}  # source -> HTTP status to fail with
+        self.requests = 0
+        self.paths = Counter()  # requests per path and query
+        self._server = None
+
+    def __enter__(self):
+        stubs = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stubs.requests += 1
+                stubs.paths[self.path] += 1
+                stubs.handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        # Clients that gave up on a slow source close the socket mid-response
+        self._server.handle_error = lambda request, client_address: None
+        threading.Thread(target=self._server.serve_forever, name="search-stubs", daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+        return False
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def env(self):
+        return {
+            "SEMANTIC_SCHOLAR_URL": f"{self.url}/s2",
+            "ARXIV_URL": f"{self.url}/arxiv",
+            "OPENALEX_URL": f"{self.url}/openalex",
+            "SPRINGER_URL": f"{self.url}/springer",
+            "GOOGLE_CSE_URL": f"{self.url}/google/customsearch/v1",
+            "WEB_SCRAPER_URL": f"{self.url}/web/search",
+        }
+
+    def pdf_link(self, i):
+        return f"{self.url}/pdf/{i % len(self.pdfs)}.pdf"
+
+    def _papers(self, query, source):
+        return [
+            {"title": f"{query} ({source} result {i + 1})", "pdf_link": self.pdf_link(zlib.crc32(f"{source}{query}{i}".encode()))}
+            for i in range(self.results_per_source)
+        ]
+
+    def handle(self, request):
+        url = urlparse(request.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        source = url.path.strip("/").split("/")[0]
+
+        if url.path.endswith(".pdf"):
+            time.sleep(self.latencies["pdf"])
+            name = url.path.rsplit("/", 1)[-1][:-len(".pdf")]
+            index = int(name) if name.isdigit() else zlib.crc32(url.path.encode())
+            return self._send(request, self.pdfs[index % len(self.pdfs)], "application/pdf")
+
+        if source not in self.latencies:
+            return request.send_error(404)
+        time.sleep(self.latencies[source])
+        if source in self.statuses:
+            return request.send_error(self.statuses[source])
+
+        if source == "s2":
+            papers = self._papers(params.get("query", ""), source)
+            body = {"data": [{"title": p["title"], "url": p["pdf_link"], "openAccessPdf": {"url": p["pdf_link"]}} for p in papers]}
+            return self._send(request, json.dumps(body).encode(), "application/json")
+        if source == "arxiv":
+            papers = self._papers(params.get("search_query", "").removeprefix("all:"), source)
+            entries = "".join(
+                f'<entry><title>{p["title"]}</title><link type="application/pdf" href="{p["pdf_link"]}"/></entry>'
+                for p in papers
+            )
+            body = f'<?xml version="1.0"?><feed xmlns="http://www.w3.org/2005/Atom">{entries}</feed>'
+            return self._send(request, body.encode(), "application/atom+xml")
+        if source == "openalex":
+            query = params.get("filter", "").split(",")[0].removeprefix("title.search:")
+            body = {"results": [{"title": p["title"], "open_access": {"oa_url": p["pdf_link"]}} for p in self._papers(query, source)]}
+            return self._send(request, json.dumps(body).encode(), "application/json")
+        if source == "springer":
+            # The scraper turns /article/<id> into /content/pdf/<id>.pdf
+            cards = "".join(
+                f'<h3 class="app-card-open__heading"><a class="app-card-open__link" href="/springer/article/{i}">'
+                f'{p["title"]}</a></h3>'
+                for i, p in enumerate(self._papers(params.get("query", ""), source))
+            )
+            return self._send(request, f"<html><body>{cards}</body></html>".encode(), "text/html")
+        if source == "google":
+            query = params.get("q", "").removesuffix(" filetype:pdf")
+            body = {"items": [{"title": p["title"], "link": p["pdf_link"]} for p in self._papers(query, source)]}
+            return self._send(request, json.dumps(body).encode(), "application/json")
+        if source == "web":
+            body = {"status": "success", "message": "stub", "data": self._papers(params.get("query", ""), source)}
+            return self._send(request, json.dumps(body).encode(), "application/json")
+
+    def _send(self, request, body, content_type):
+        request.send_response(200)
+        request.send_header("Content-Type", content_type)
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
@@ -1,12 +1,26 @@
 import os
 import re
+import time
 import streamlit as st
 from dotenv import load_dotenv
 from langchain_groq import ChatGroq
 from langchain.schema import HumanMessage, SystemMessage
+from utils.embedding import load_model
+from utils.doc_loader import match_image
+from utils.context_builder import build_context
+from utils.tracing import traced, span, record
 load_dotenv()
 API = os.getenv('GROQ')
 
+# Hybrid retrieval: chunks kept, candidates per retriever, reciprocal-rank-fusion constant
+RETRIEVAL_K = int(os.getenv('RETRIEVAL_K', '4'))
+RETRIEVAL_K_VECTOR = int(os.getenv('RETRIEVAL_K_VECTOR', '8'))
+RETRIEVAL_K_LEXICAL = int(os.getenv('RETRIEVAL_K_LEXICAL', '8'))
+RRF_K = int(os.getenv('RRF_K', '60'))
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', '1000'))
+# Expand a hit to its whole section when the section fits in the budget
+CONTEXT_EXPAND_SECTIONS = os.getenv('CONTEXT_EXPAND_SECTIONS', 'true').lower() == 'true'
+
 if 'sys_u' not in st.session_state:
     st.session_state.sys_u = False
 
@@ -18,20 +32,77 @@ def create_llm():
         temperature=0.3,  # adjust for creativity
     )
 
-def get_context(query, vectorstore):
-    docs = vectorstore.similarity_search(query)
+@traced("retrieve")
+def retrieve(query, vectorstore, figures, k=RETRIEVAL_K, k_vector=RETRIEVAL_K_VECTOR, k_lexical=RETRIEVAL_K_LEXICAL):
+    """
+    Per-turn retrieval: embeds the query once and reuses the vector for both
+    the chunk search and the figure search. vectorstore is a PaperIndex or
+    a LibrarySelection of several papers. Chunks come from BM25 and FAISS
+    fused by reciprocal rank, then are merged, deduplicated and packed into
+    CONTEXT_TOKEN_BUDGET tokens.
+
+    Returns a dict with the packed context docs, the fused chunk scores,
+    context token stats, the matched figure record (or None) with its cosine score,
+    the query embedding and per-step timings in seconds.
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    query_embedding = load_model().embed_query(query)
+    timings["embed_query"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    docs_and_scores = vectorstore.hybrid_search(
+        query, query_embedding, k=k, k_vector=k_vector, k_lexical=k_lexical, rrf_k=RRF_K
+    )
+    timings["chunk_search"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    context_docs, context_stats = build_context(
+        [doc for doc, _ in docs_and_scores],
+        CONTEXT_TOKEN_BUDGET,
+        sections=vectorstore.sections if CONTEXT_EXPAND_SECTIONS else None,
+    )
+    timings["context_build"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    figure, img_score = match_image(query_embedding, figures)
+    timings["figure_search"] = time.perf_counter() - start
+
+    for step, seconds in timings.items():
+        # The context step also carries its token stats, e.g. tokens saved per turn
+        record(f"retrieve.{step}", seconds, **(context_stats if step == "context_build" else {}))
+
+    return {
+        "docs": context_docs,
+        "chunk_scores": [float(score) for _, score in docs_and_scores],
+        "context": context_stats,
+        "image": figure,
+        "query_embedding": query_embedding,
+        "image_score": img_score,
+        "timings": timings,
+    }
+
+def format_context(docs):
     context = ""
     for i, doc in enumerate(docs):
         page = doc.metadata.get("page_label", doc.metadata.get("page", "N/A"))
-        source = doc.metadata.get("source", "unknown")
-        context += f"\n---\n[Page {page} from {source}]\n{doc.page_content.strip()}\n"
+        pages = doc.metadata.get("pages")
+        if pages and len(pages) > 1:
+            page = f"{pages[0]}-{pages[-1]}"
+        source = doc.metadata.get("paper") or doc.metadata.get("source", "unknown")
+        section = doc.metadata.get("section")
+        section = f", section \"{section}\"" if section else ""
+        context += f"\n---\n[Page {page}{section} from {source}]\n{doc.page_content.strip()}\n"
 
     return (context)
 
-def build_messages(query: str, vectorstore):
-    context = get_context(query, vectorstore)
+@traced("build_messages")
+def build_messages(query: str, retrieval: dict):
+    context = format_context(retrieval["docs"])
 
-    memory_msgs = st.session_state.chat_memory.load_memory_variables({})["history"]
+    with span("build_messages.memory"):
+        memory_msgs = st.session_state.chat_memory.load_memory_variables({})["history"]
 
     messages = []
 
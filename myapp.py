@@ -2,21 +2,27 @@ import streamlit as st
 st.set_page_config(page_title="Research.io | AI assistant for Your Research work", layout="wide",page_icon='👨‍🎓')
 
 import os
-import ast
 import time
-import json5
-from PIL import Image
+import uuid
 import streamlit as st
 
 from agent.ToolPapSe import select_paper
 from streamlit_pdf_viewer import pdf_viewer
-from langchain.memory import ConversationSummaryBufferMemory
-from utils.doc_loader import download_pdf, find_relevant_image
-from llm_engine import create_llm, build_messages, clean_state, render_llm_math
+from utils.memory import RollingMemory
+from utils.answer_cache import answer_cache, context_fingerprint, replay
+from utils.doc_loader import download_pdf
+from utils.figures import figure_image
+from utils.paper_store import PaperHandle, release_paper, store as paper_store
+from utils.library import get_library
+from utils.digest import get_digest, overview_answer, render_digest, schedule_digest
+from utils.tracing import TRACE_ENABLED, TRACE_BUFFER, span, trace_stream, stage_stats, recent_spans, serve_metrics
+from llm_engine import create_llm, retrieve, build_messages, clean_state, render_llm_math
 
 
 # ------------------------ Session State Init ------------------------
 
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 if "paper_title" not in st.session_state:
     st.session_state.paper_title = None
 if 'vectorstore' not in st.session_state:
@@ -25,6 +31,10 @@ if 'pdf_file' not in st.session_state:
     st.session_state.pdf_file = None
 if 'pdf_img' not in st.session_state:
     st.session_state.pdf_img = None
+if 'library_selection' not in st.session_state:
+    st.session_state.library_selection = []
+if 'paper_candidates' not in st.session_state:
+    st.session_state.paper_candidates = []
 if "selected_view" not in st.session_state:
     st.session_state.selected_view = "Load Paper"
 if "chat_history" not in st.session_state:
@@ -32,10 +42,9 @@ if "chat_history" not in st.session_state:
 if 'sys_u' not in st.session_state:
     st.session_state.sys_u = False
 if "chat_memory" not in st.session_state:
-    st.session_state.chat_memory = ConversationSummaryBufferMemory(
+    st.session_state.chat_memory = RollingMemory(
         llm=create_llm(),
         max_token_limit=600,
-        return_messages=True
     )
 
 def local_css(file_name):
@@ -44,6 +53,51 @@ def local_css(file_name):
 
 local_css("static/css/rstyle.css")
 
+@st.fragment(run_every=1)
+def indexing_progress():
+    index = st.session_state.vectorstore
+    if not isinstance(index, PaperHandle):
+        return
+
+    if index.error:
+        st.warning(f"⚠️ Indexing stopped after page {index.pages_done}: {index.error}")
+    elif not index.done.is_set():
+        st.progress(
+            index.progress,
+            text=f"Indexing pages {index.pages_done}/{index.total_pages} — you can already ask about the pages indexed so far",
+        )
+
+def load_web_paper(paper):
+    with st.spinner('Processing The Paper....'):
+        st.success(f"📄 Selected Paper: {paper['title']}")
+        previous = st.session_state.vectorstore
+        # Before the download: clean_state resets pdf_img, which the download sets
+        clean_state(False)
+
+        bar = st.progress(0.0, text="Downloading…")
+
+        def on_progress(received, total):
+            mb = received / 2**20
+            if total:
+                bar.progress(min(received / total, 1.0), text=f"Downloading… {mb:.1f} / {total / 2**20:.1f} MB")
+            else:
+                bar.progress(0.0, text=f"Downloading… {mb:.1f} MB")
+
+        st.session_state.pdf_img, st.session_state.pdf_file, st.session_state.vectorstore = download_pdf(paper["pdf_link"], on_progress=on_progress)
+        bar.empty()
+        # Released only now, so reopening the same paper keeps it resident
+        release_paper(previous)
+        schedule_digest(st.session_state.vectorstore, create_llm())
+
+        st.session_state.paper_title = paper["title"]
+
+        st.success("✅ Paper Loaded from Web! Redirecting to chat...")
+
+        st.session_state.selected_view = 'Chat with Paper'
+
+        time.sleep(0.2)
+        st.rerun()
+
 # ------------------------ Sidebar ------------------------
 
 st.sidebar.title("📚 Paper Assistant")
@@ -61,6 +115,39 @@ if st.sidebar.button("💬 Chat with Paper"):
 if st.sidebar.button("🔍 Search & Select Paper"):
     st.session_state.selected_view = "Search & Select Paper"
 
+if st.sidebar.button("📚 Library"):
+    st.session_state.selected_view = "Library"
+
+stats = paper_store.stats()
+st.sidebar.caption(
+    f"Shared papers in memory: {stats['papers']} ({stats['resident_bytes'] / 2**20:.0f} MB), "
+    f"{stats['handles']} open, {stats['hits']} hits / {stats['misses']} misses"
+)
+answer_stats = answer_cache.stats()
+st.sidebar.caption(
+    f"Answer cache: {answer_stats['entries']} answers, {answer_stats['hit_rate']:.0%} hit rate "
+    f"({answer_stats['hits']} / {answer_stats['hits'] + answer_stats['misses']})"
+)
+
+if TRACE_ENABLED:
+    serve_metrics()
+    with st.sidebar.expander("⏱️ Timings"):
+        st.dataframe(stage_stats(), hide_index=True)
+        turns = [s for s in recent_spans(TRACE_BUFFER) if s["name"] == "chat.turn"]
+        if turns:
+            st.caption("Last chat turn")
+            last_turn = recent_spans(trace=turns[-1]["trace"])
+            st.dataframe(
+                [{"stage": s["name"], "ms": s["duration_ms"], "ttft_ms": s.get("ttft_ms")} for s in last_turn],
+                hide_index=True,
+            )
+            context = next((s for s in last_turn if s["name"] == "retrieve.context_build"), None)
+            if context:
+                st.caption(
+                    f"Context: {context['tokens']} tokens, {context['tokens_saved']} saved of "
+                    f"{context['raw_tokens']} retrieved, {context['expanded_tokens']} added by section expansion"
+                )
+
 
 
 
@@ -70,12 +157,17 @@ if st.session_state.selected_view == "Load Paper":
     st.header("📄 Load Your Research Paper")
     uploaded = st.file_uploader("Upload a Paper", type="pdf")
     if uploaded:
-        st.session_state.pdf_file = uploaded.getvalue()
+        st.session_state.paper_candidates = []
+        previous = st.session_state.vectorstore
         clean_state()
 
         with st.spinner('Processing The Paper....'):
             st.session_state.pdf_img, st.session_state.vectorstore = download_pdf(uploaded, False)
+            # The viewer shares the stored bytes instead of keeping its own copy
+            st.session_state.pdf_file = st.session_state.vectorstore.pdf_bytes
             st.session_state.paper_title = uploaded.name
+        release_paper(previous)
+        schedule_digest(st.session_state.vectorstore, create_llm())
 
         st.session_state.selected_view = 'Chat with Paper'
         st.success("✅ Paper Loaded Successfully! Redirecting to chat...")
@@ -97,8 +189,35 @@ elif st.session_state.selected_view == 'Check Paper':
 elif st.session_state.selected_view == "Chat with Paper":
     st.header("🤖 Ask Questions About Your Paper")
 
-    if st.session_state.paper_title:
-        st.markdown(f"📝 Paper: {st.session_state.paper_title}")
+    library_selection = st.session_state.library_selection
+    if st.session_state.paper_title or library_selection:
+        if library_selection:
+            st.markdown(f"📚 Answering from {len(library_selection)} library paper(s) — change the selection in the Library")
+        else:
+            st.markdown(f"📝 Paper: {st.session_state.paper_title}")
+        indexing_progress()
+
+        index = st.session_state.vectorstore
+        if isinstance(index, PaperHandle) and index.done.is_set() and index.vectorstore is not None:
+            if get_library().paper_id(index.key) is None and st.button("➕ Add to library"):
+                get_library().add_paper(index.key, st.session_state.paper_title, index.vectorstore)
+                st.rerun()
+
+        digest = get_digest(index.key) if isinstance(index, PaperHandle) and not library_selection else None
+        if digest:
+            with st.expander("Paper digest"):
+                st.markdown(render_digest(digest))
+
+        # Candidates of the last search are prefetched, so switching is fast
+        alternatives = [p for p in st.session_state.paper_candidates if p["title"] != st.session_state.paper_title]
+        if alternatives:
+            with st.expander("Other candidates from your search"):
+                for i, alternative in enumerate(alternatives):
+                    if st.button(alternative["title"], key=f"alternative-{i}"):
+                        try:
+                            load_web_paper(alternative)
+                        except RuntimeError as e:
+                            st.error(f"❌ Error: {e}")
 
         # Render existing chat history
         for msg in st.session_state.chat_history:
@@ -107,47 +226,97 @@ elif st.session_state.selected_view == "Chat with Paper":
             elif msg['type'] == 'assistant':
                 st.markdown(msg["text"], unsafe_allow_html=True)
             elif msg['type'] == 'img':
-                img = Image.open(msg["text"])
-                st.image(img, width=350)
+                image = figure_image(st.session_state.pdf_file, msg["text"], st.session_state.vectorstore.key)
+                if image:
+                    st.image(image, width=350)
 
         query = st.chat_input("Ask a question:")
 
         if query:
-            st.session_state.chat_history.append({"type": "user", "text": query})
-            st.markdown(f'<div class="user-msg">{query}</div>', unsafe_allow_html=True)
+            with span("chat.turn", scope="library" if library_selection else "paper") as turn:
+                st.session_state.chat_history.append({"type": "user", "text": query})
+                st.markdown(f'<div class="user-msg">{query}</div>', unsafe_allow_html=True)
+
+                source = get_library().select(library_selection) if library_selection else st.session_state.vectorstore
+                # The library keeps no figures or PDF bytes, and the open paper's
+                # figures would not belong to the chunks the answer comes from
+                figures = None if library_selection else st.session_state.pdf_img
+                retrieval = retrieve(query, source, figures)
+                figure = retrieval["image"]
+
+                # Same paper, same context and a near-identical question: replay the earlier answer
+                scope = "library:" + ",".join(map(str, sorted(library_selection))) if library_selection else st.session_state.vectorstore.key
+                fingerprint = context_fingerprint(retrieval["docs"])
+                # Overview questions are answered from the precomputed digest when it is ready
+                digest_answer = None if library_selection else overview_answer(query, scope)
+                cached_answer = digest_answer or answer_cache.get(scope, fingerprint, retrieval["query_embedding"])
+
+                turn.set(answered_from="digest" if digest_answer else "llm" if cached_answer is None else "answer_cache")
+                if cached_answer is None:
+                    messages = build_messages(query, retrieval)
+                    tokens = trace_stream("llm.stream", (chunk.content or "" for chunk in create_llm().stream(messages)))
+                elif digest_answer:
+                    tokens = [digest_answer]  # precomputed, nothing to pace
+                else:
+                    tokens = replay(cached_answer)
+
+                answer_box = st.empty()
+            
+                full_answer = r""
+                for token in tokens:
+                    full_answer += token
+                    answer_box.markdown(full_answer)
 
-            img_path = find_relevant_image(query, st.session_state.pdf_img)
+                if cached_answer is None:
+                    answer_cache.put(scope, fingerprint, retrieval["query_embedding"], full_answer)
 
-            messages = build_messages(query, st.session_state.vectorstore)
+                full_answer = render_llm_math(full_answer)
+                answer_box.markdown(full_answer, unsafe_allow_html=True)
 
-            answer_box = st.empty()
-            
-            full_answer = r""
-            for chunk in create_llm().stream(messages):
-                token = chunk.content or ""
-                full_answer += token
-                answer_box.markdown(full_answer)
-
-            full_answer = render_llm_math(full_answer)
-            answer_box.markdown(full_answer, unsafe_allow_html=True)
-
-            st.session_state.chat_history.append({"type": "assistant", "text": full_answer})
-
-            if img_path:
-                img = Image.open(img_path)
-                st.image(img, width=350)
-                st.session_state.chat_history.append({'type': 'img', 'text': img_path})
-
-            # Clear thinking once done
-            st.session_state.chat_memory.save_context(
-                inputs={"input": query}, 
-                outputs={"output": full_answer}
-            )
+                st.session_state.chat_history.append({"type": "assistant", "text": full_answer})
+
+                # Only the selected figure is decoded; history keeps the record
+                image = figure_image(st.session_state.pdf_file, figure, st.session_state.vectorstore.key) if figure else None
+                if image:
+                    st.image(image, width=350)
+                    st.session_state.chat_history.append({'type': 'img', 'text': figure})
+
+                # Returns at once; older turns are summarized in the background
+                st.session_state.chat_memory.save_context(
+                    inputs={"input": query}, 
+                    outputs={"output": full_answer}
+                )
 
         
     else:
         st.warning("⚠️ Please load a Paper first from the sidebar.")
 
+# ------------------------ Library UI ------------------------
+
+elif st.session_state.selected_view == "Library":
+    st.header("📚 Paper Library")
+
+    library = get_library()
+    papers = library.papers()
+
+    if papers:
+        titles = {paper["id"]: paper["title"] for paper in papers}
+        st.session_state.library_selection = st.multiselect(
+            "Chat across these papers (leave empty to chat with the open paper)",
+            options=list(titles),
+            format_func=titles.get,
+            default=[i for i in st.session_state.library_selection if i in titles],
+        )
+
+        for paper in papers:
+            col1, col2 = st.columns([5, 1])
+            col1.markdown(f"**{paper['title']}** — {paper['chunks']} chunks")
+            if col2.button("Remove", key=f"remove-{paper['id']}"):
+                library.remove_paper(paper["id"])
+                st.rerun()
+    else:
+        st.info("The library is empty. Open a paper and use ➕ Add to library in the chat.")
+
 # ------------------------ Search & Select Paper UI ------------------------
 
 elif st.session_state.selected_view == "Search & Select Paper":
@@ -159,33 +328,12 @@ elif st.session_state.selected_view == "Search & Select Paper":
         try:
             with st.spinner("Searching and selecting best paper..."):
             
-                paper = select_paper(user_query)
-                try:
-                    paper = json5.loads(paper)
-                except json5.JSONDecodeError:
-                    paper = ast.literal_eval(paper)
-
-                if not paper or "pdf_link" not in paper:
+                paper = select_paper(user_query, owner=st.session_state.session_id)
+                if paper is None:
                     raise ValueError("No valid paper found.")
 
-                if 'arxiv' in paper['pdf_link']:
-                    paper['pdf_link'] = paper['pdf_link'].replace('abs','pdf')
-
-            with st.spinner('Processing The Paper....'):
-                st.success(f"📄 Selected Paper: {paper['title']}")
-                
-                st.session_state.pdf_img, st.session_state.pdf_file, st.session_state.vectorstore = download_pdf(paper["pdf_link"])
-
-                st.session_state.paper_title = paper["title"]
-
-                clean_state(False)
-
-                st.success("✅ Paper Loaded from Web! Redirecting to chat...")
-
-                st.session_state.selected_view = 'Chat with Paper'
-
-                time.sleep(0.2)
-                st.rerun()
+            st.session_state.paper_candidates = [paper, *paper.get("alternatives", [])]
+            load_web_paper(paper)
 
         except Exception as e:
             st.error(f"❌ Error: {e}")
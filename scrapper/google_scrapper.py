@@ -1,14 +1,17 @@
 import os
 import requests
+from utils import http_client
 from urllib.parse import quote
 
 
 API_KEY = os.getenv('API_KEY') 
 CSE_ID = os.getenv('CSE_ID')
+# Overridable so the search can be pointed at a local stub
+GOOGLE_CSE_URL = os.getenv('GOOGLE_CSE_URL', 'https://www.googleapis.com/customsearch/v1')
 
 def gsearch_pdf_links(query, max_results=10):
     query = query + ' filetype:pdf'
-    url = "https://www.googleapis.com/customsearch/v1"
+    url = GOOGLE_CSE_URL
     
     params = {
         "key": API_KEY,
@@ -18,7 +21,7 @@ def gsearch_pdf_links(query, max_results=10):
     }
 
     try:
-        response = requests.get(url, params=params)
+        response = http_client.get(url, params=params)
         response.raise_for_status()
         
     except requests.exceptions.RequestException as e:
@@ -1,20 +1,44 @@
-import requests
+import os
+import time
+from utils import http_client
 from bs4 import BeautifulSoup
 from urllib.parse import quote
 import xml.etree.ElementTree as ET
 from urllib.parse import urljoin, quote
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
+# Base URLs are overridable so the sources can be pointed at local stubs
+SEMANTIC_SCHOLAR_URL = os.getenv('SEMANTIC_SCHOLAR_URL', 'https://api.semanticscholar.org')
+ARXIV_URL = os.getenv('ARXIV_URL', 'http://export.arxiv.org')
+OPENALEX_URL = os.getenv('OPENALEX_URL', 'https://api.openalex.org')
+SPRINGER_URL = os.getenv('SPRINGER_URL', 'https://link.springer.com')
 
-def get_semantic_scholar_pdfs(query):
-    url = f"https://api.semanticscholar.org/graph/v1/paper/search?query={quote(query)}&limit=5&fields=title,url,openAccessPdf"
-    response = requests.get(url, headers={"User-Agent": "AcademicBot/1.0"})
+# Seconds one source may take, and the budget for the whole fan-out
+SOURCE_TIMEOUT = float(os.getenv('SOURCE_TIMEOUT', '8'))
+SEARCH_DEADLINE = float(os.getenv('SEARCH_DEADLINE', '10'))
+# Per-source deadlines, e.g. SPRINGER_TIMEOUT=4 for the scraped source
+SOURCE_TIMEOUTS = {
+    name: float(os.getenv(f'{name.upper()}_TIMEOUT', SOURCE_TIMEOUT))
+    for name in ("SemanticScholar", "ArXiv", "OpenAlex", "Springer")
+}
+
+# Long-lived pool: the caller returns at the deadline without waiting for
+# the source, which a `with` block would do. Sources are tried once with
+# timeouts from what is left of their deadline, so their threads free up
+# about then too.
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="open-access")
+
+
+def get_semantic_scholar_pdfs(query, timeout=SOURCE_TIMEOUT):
+    url = f"{SEMANTIC_SCHOLAR_URL}/graph/v1/paper/search?query={quote(query)}&limit=5&fields=title,url,openAccessPdf"
+    response = http_client.get(url, headers={"User-Agent": "AcademicBot/1.0"}, timeout=timeout, retry=False)
+    response.raise_for_status()
     data = response.json()
     results = []
 
     for paper in data.get("data", []):
         title = paper.get("title")
-        pdf_url = paper.get("openAccessPdf", {}).get("url")
+        pdf_url = (paper.get("openAccessPdf") or {}).get("url")
         if pdf_url:
             results.append({
                 "title": title,
@@ -22,9 +46,10 @@ def get_semantic_scholar_pdfs(query):
             })
     return results
 
-def get_arxiv_pdfs(query):
-    url = f"http://export.arxiv.org/api/query?search_query=all:{quote(query)}&start=0&max_results=10"
-    response = requests.get(url, headers={"User-Agent": "AcademicBot/1.0"})
+def get_arxiv_pdfs(query, timeout=SOURCE_TIMEOUT):
+    url = f"{ARXIV_URL}/api/query?search_query=all:{quote(query)}&start=0&max_results=10"
+    response = http_client.get(url, headers={"User-Agent": "AcademicBot/1.0"}, timeout=timeout, retry=False)
+    response.raise_for_status()
     root = ET.fromstring(response.text)
     ns = {'atom': 'http://www.w3.org/2005/Atom'}
 
@@ -43,13 +68,14 @@ def get_arxiv_pdfs(query):
             })
     return results
 
-def get_openalex_pdfs(query):
+def get_openalex_pdfs(query, timeout=SOURCE_TIMEOUT):
     url = (
-        "https://api.openalex.org/works"
+        f"{OPENALEX_URL}/works"
         f"?filter=title.search:{quote(query)},open_access.is_oa:true"
         "&per-page=5"
     )
-    response = requests.get(url, headers={"User-Agent": "AcademicBot/1.0"})
+    response = http_client.get(url, headers={"User-Agent": "AcademicBot/1.0"}, timeout=timeout, retry=False)
+    response.raise_for_status()
     data = response.json()
 
     results = []
@@ -63,15 +89,16 @@ def get_openalex_pdfs(query):
             })
     return results
 
-def get_springer(query, max_results=5):
-    base_url = "https://link.springer.com"
+def get_springer(query, max_results=5, timeout=SOURCE_TIMEOUT):
+    base_url = SPRINGER_URL
     search_url = f"{base_url}/search?query={quote(query)}&openAccess=true&facet-discipline=%22Computer+Science%22&sortBy=relevance"
     
     headers = {
         "User-Agent": "Mozilla/5.0 (compatible; AcademicBot/1.0)"
     }
 
-    response = requests.get(search_url, headers=headers)
+    response = http_client.get(search_url, headers=headers, timeout=timeout, retry=False)
+    response.raise_for_status()
     soup = BeautifulSoup(response.text, "html.parser")
 
     results = []
@@ -88,28 +115,89 @@ def get_springer(query, max_results=5):
 
     return results
 
-def osearch_pdf_links(query):
-    sources = {
-        "SemanticScholar": get_semantic_scholar_pdfs,
-        "ArXiv": get_arxiv_pdfs,
-        # "OpenAlex": get_openalex_pdfs,
-        'Springer':get_springer
-    }
+SOURCES = {
+    "SemanticScholar": get_semantic_scholar_pdfs,
+    "ArXiv": get_arxiv_pdfs,
+    "OpenAlex": get_openalex_pdfs,
+    "Springer": get_springer,
+}
+DEFAULT_SOURCES = ["SemanticScholar", "ArXiv", "Springer"]
+
+
+def _timed(func, query, cutoff):
+    # A source started late on a busy pool only gets what is left of its deadline
+    start = time.monotonic()
+    remaining = cutoff - start
+    if remaining <= 0:
+        raise TimeoutError("timeout")
+    results = func(query, timeout=(min(http_client.CONNECT_TIMEOUT, remaining), remaining))
+    return results, time.monotonic() - start
+
+
+def fan_out(query, sources=None, source_timeout=None, deadline=SEARCH_DEADLINE):
+    """
+    Queries the sources concurrently. Each source gets its deadline from
+    source_timeout (seconds for all sources, or a mapping per source;
+    SOURCE_TIMEOUTS by default) and the whole call returns within deadline
+    seconds with whatever has arrived; slow or failing sources never
+    discard the rest.
 
-    pdf_results = []
+    Returns (results, stats) where stats maps each source to its latency,
+    result count and error (None on success).
+    """
+    if source_timeout is None:
+        source_timeout = SOURCE_TIMEOUTS
+    start = time.monotonic()
+    cutoff = {}
+    futures = {}
+    for name in sources or DEFAULT_SOURCES:
+        timeout = source_timeout.get(name, SOURCE_TIMEOUT) if isinstance(source_timeout, dict) else source_timeout
+        cutoff[name] = start + min(timeout, deadline)
+        futures[_executor.submit(_timed, SOURCES[name], query, cutoff[name])] = name
 
-    with ThreadPoolExecutor(max_workers = 4) as executor:
-        futures = {executor.submit(func, query): name for name, func in sources.items()}
-        
-        for future in as_completed(futures):
-            source_name = futures[future]
+    results, stats = [], {}
+    pending = set(futures)
+    while pending:
+        now = time.monotonic()
+        for future in [f for f in pending if now >= cutoff[futures[f]]]:
+            pending.discard(future)
+            future.cancel()
+            stats[futures[future]] = {"latency": now - start, "count": 0, "error": "timeout"}
+        if not pending:
+            break
+
+        done, pending = wait(
+            pending,
+            timeout=min(cutoff[futures[f]] for f in pending) - now,
+            return_when=FIRST_COMPLETED,
+        )
+        for future in done:
+            name = futures[future]
             try:
-                pdf_results.extend(future.result())
+                source_results, latency = future.result()
+                results.extend(source_results)
+                stats[name] = {"latency": latency, "count": len(source_results), "error": None}
             except Exception as e:
-                return {
-                    "status": "error",
-                    "message": f"No PDF links found, got error {str(e)}",
-                    "data": None
-                }
-    
-    return pdf_results
+                stats[name] = {"latency": time.monotonic() - start, "count": 0, "error": str(e)}
+
+    return results, stats
+
+
+def osearch_pdf_links(query):
+    pdf_results, stats = fan_out(query)
+
+    if not pdf_results:
+        errors = ", ".join(f"{name}: {s['error']}" for name, s in stats.items() if s["error"])
+        return {
+            "status": "error",
+            "message": f"No PDF links found{', got errors ' + errors if errors else ''}",
+            "data": None,
+            "sources": stats,
+        }
+
+    return {
+        "status": "success",
+        "message": "PDF links retrieved successfully.",
+        "data": pdf_results,
+        "sources": stats,
+    }
@@ -1,8 +1,11 @@
-import requests
+import os
+from utils import http_client
+
+# Replace this with your actual deployed Render URL, or point it at a local stub
+WEB_SCRAPER_URL = os.getenv('WEB_SCRAPER_URL', 'https://oscraper.onrender.com/search')
 
-# Replace this with your actual deployed Render URL
 def web_scrapper(query: str, max_results :int = 5):
-    BASE_URL = "https://oscraper.onrender.com/search"
+    BASE_URL = WEB_SCRAPER_URL
 
     params = {
         "query": query,
@@ -10,7 +13,8 @@ def web_scrapper(query: str, max_results :int = 5):
     }
 
     try:
-        response = requests.get(BASE_URL, params=params)
+        # Generous read timeout: the Render instance may need a cold start
+        response = http_client.get(BASE_URL, params=params, timeout=(5, 90))
         response.raise_for_status()
         data = response.json()
         return data
@@ -0,0 +1,25 @@
+import os
+import sys
+import tempfile
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import make_pdf
+from benchmarks.fakes import HashEmbeddings, SearchStubs
+from benchmarks.bench_suite import offline_env, install_embeddings
+
+# The app modules read their settings and bind load_model at import, so the
+# offline sandbox is set up before any test module imports them
+_workdir = tempfile.TemporaryDirectory()
+_stubs = SearchStubs([make_pdf(4, 1), make_pdf(6, 1, seed=1)]).__enter__()
+offline_env(_workdir.name, _stubs)
+install_embeddings(HashEmbeddings())
+
+
+@pytest.fixture
+def stubs():
+    latencies = dict(_stubs.latencies)
+    yield _stubs
+    _stubs.latencies = latencies
+    _stubs.statuses = {}
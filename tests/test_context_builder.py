@@ -0,0 +1,34 @@
+from langchain_core.documents import Document
+from utils.context_builder import build_context
+from utils.sections import SectionTree
+
+
+def _chunk(text, page, start, section_id=None):
+    metadata = {"source": "paper.pdf", "page": page, "start_index": start}
+    if section_id:
+        metadata["section_id"] = section_id
+    return Document(page_content=text, metadata=metadata)
+
+
+def test_overlapping_chunks_merge_into_the_covered_text():
+    text = "".join(chr(ord("a") + i % 26) for i in range(150))
+    docs, _ = build_context([_chunk(text[:100], 0, 0), _chunk(text[50:], 0, 50)], 1000)
+    assert [doc.page_content for doc in docs] == [text]
+
+
+def test_spans_are_packed_in_the_rank_of_their_best_chunk():
+    best, second, third = "alpha " * 40, "bravo " * 40, "charlie " * 30
+    # The third-ranked chunk shares a page with the best one, but not its text
+    ranked = [_chunk(best, 0, 0), _chunk(second, 1, 0), _chunk(third, 0, 1000)]
+    docs, stats = build_context(ranked, 130)
+    assert [doc.page_content for doc in docs] == [best, second]
+    assert stats["dropped"] == 1
+
+
+def test_section_expansion_is_reported_apart_from_tokens_saved():
+    sections = SectionTree({"sec-0": {"title": "3 Method", "pages": [2], "paragraphs": ["delta " * 100]}})
+    docs, stats = build_context([_chunk("delta " * 10, 2, 0, "sec-0")], 1000, sections=sections)
+
+    assert docs[0].page_content.startswith("3 Method")
+    assert stats["tokens_saved"] == 0
+    assert stats["expanded_tokens"] == stats["tokens"] - stats["raw_tokens"] > 0
@@ -0,0 +1,24 @@
+import pytest
+from utils.digest import is_overview_query
+
+
+@pytest.mark.parametrize("query", [
+    "Can you summarize this paper?",
+    "tl;dr",
+    "Give me an overview of the paper",
+    "What are the main contributions?",
+    "What is this paper about?",
+    "What does the paper propose?",
+])
+def test_whole_paper_questions_are_overview_queries(query):
+    assert is_overview_query(query)
+
+
+@pytest.mark.parametrize("query", [
+    "Summarize the results in Table 2",
+    "key findings of the ablation in section 4",
+    "summary statistics of the dataset",
+    "Give an overview of the training setup",
+])
+def test_questions_about_part_of_the_paper_are_not(query):
+    assert not is_overview_query(query)
@@ -0,0 +1,52 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.messages import AIMessage, SystemMessage
+from utils import memory
+from utils.memory import RollingMemory
+
+
+class BlockingLLM:
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = 0
+
+    def invoke(self, prompt):
+        self.calls += 1
+        self.release.wait(5)
+        return AIMessage(content=f"summary {self.calls}")
+
+
+def _overflow(mem, turns=3):
+    for i in range(turns):
+        mem.save_context({"input": f"question {i} " * 10}, {"output": f"answer {i} " * 10})
+
+
+def _wait(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_summaries_past_the_queue_bound_wait_for_the_next_save(monkeypatch):
+    monkeypatch.setattr(memory, "_executor", ThreadPoolExecutor(max_workers=1))
+    monkeypatch.setattr(memory, "MEMORY_SUMMARY_QUEUE", 1)
+    llm = BlockingLLM()
+    running, queued, deferred = (RollingMemory(llm, max_token_limit=20) for _ in range(3))
+
+    _overflow(running)
+    _wait(lambda: llm.calls == 1)
+    _overflow(queued)
+    _overflow(deferred)
+    # One session holds the worker and one waits for it; the third does not queue
+    assert queued._running and not deferred._running
+    assert memory._queued == 1
+    history = deferred.load_memory_variables()["history"]
+    assert not isinstance(history[0], SystemMessage) and len(history) == 6
+
+    llm.release.set()
+    _wait(lambda: not running._running and not queued._running)
+    _overflow(deferred, turns=1)
+    _wait(lambda: deferred.summary)
+    assert memory._queued == 0
@@ -0,0 +1,84 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from scrapper import open_access
+from scrapper.open_access import fan_out, osearch_pdf_links
+
+SOURCES = ["SemanticScholar", "ArXiv", "OpenAlex"]
+
+
+def test_fan_out_collects_every_source_with_latency_stats(stubs):
+    stubs.latencies.update(s2=0.05, arxiv=0.1, openalex=0.02)
+    results, stats = fan_out("sparse attention", SOURCES, source_timeout=2, deadline=3)
+
+    assert len(results) == 3 * stubs.results_per_source
+    assert set(stats) == set(SOURCES)
+    for name in SOURCES:
+        assert stats[name]["error"] is None
+        assert stats[name]["count"] == stubs.results_per_source
+    assert 0.1 <= stats["ArXiv"]["latency"] < 2
+    assert stats["OpenAlex"]["latency"] < stats["ArXiv"]["latency"]
+
+
+def test_a_source_past_its_timeout_does_not_discard_the_others(stubs):
+    stubs.latencies.update(s2=0.05, arxiv=1.5, openalex=0.05)
+    start = time.monotonic()
+    results, stats = fan_out("sparse attention", SOURCES, source_timeout=0.5, deadline=3)
+
+    assert time.monotonic() - start < 1.0
+    assert stats["ArXiv"] == {"latency": stats["ArXiv"]["latency"], "count": 0, "error": "timeout"}
+    assert stats["ArXiv"]["latency"] >= 0.5
+    assert stats["SemanticScholar"]["count"] == stats["OpenAlex"]["count"] == stubs.results_per_source
+    assert len(results) == 2 * stubs.results_per_source
+
+
+def test_the_overall_deadline_bounds_the_call(stubs):
+    stubs.latencies.update(s2=0.05, arxiv=1.5, openalex=1.5)
+    start = time.monotonic()
+    results, stats = fan_out("sparse attention", SOURCES, source_timeout=5, deadline=0.4)
+
+    assert time.monotonic() - start < 0.9
+    assert stats["SemanticScholar"]["error"] is None
+    assert stats["ArXiv"]["error"] == stats["OpenAlex"]["error"] == "timeout"
+    assert len(results) == stubs.results_per_source
+
+
+def test_a_failing_source_is_reported_in_stats(stubs):
+    stubs.latencies.update(s2=0.01, arxiv=0.01, openalex=0.01)
+    stubs.statuses["arxiv"] = 404
+    results, stats = fan_out("sparse attention", SOURCES, source_timeout=2, deadline=3)
+
+    assert stats["ArXiv"]["count"] == 0
+    assert "404" in stats["ArXiv"]["error"]
+    assert stats["SemanticScholar"]["error"] is None
+    assert len(results) == 2 * stubs.results_per_source
+
+
+def test_osearch_reports_errors_when_nothing_is_found(stubs):
+    stubs.latencies.update(s2=0.01, arxiv=0.01, springer=0.01)
+    stubs.statuses.update(s2=404, arxiv=404, springer=404)
+    result = osearch_pdf_links("sparse attention")
+
+    assert result["status"] == "error" and result["data"] is None
+    assert set(result["sources"]) == {"SemanticScholar", "ArXiv", "Springer"}
+    assert all(stat["error"] for stat in result["sources"].values())
+
+
+def test_per_source_deadlines(stubs):
+    stubs.latencies.update(s2=0.3, arxiv=0.3, openalex=0.01)
+    timeouts = {"SemanticScholar": 2, "ArXiv": 0.1, "OpenAlex": 2}
+    results, stats = fan_out("sparse attention", SOURCES, source_timeout=timeouts, deadline=3)
+
+    assert stats["ArXiv"]["error"] == "timeout"
+    assert stats["SemanticScholar"]["error"] is None and stats["OpenAlex"]["error"] is None
+
+
+def test_a_timed_out_source_frees_its_worker_without_retrying(stubs, monkeypatch):
+    monkeypatch.setattr(open_access, "_executor", ThreadPoolExecutor(max_workers=1))
+    stubs.latencies.update(s2=0.01, arxiv=1.0)
+    _, stats = fan_out("hung source", ["ArXiv"], source_timeout=0.2, deadline=3)
+    assert stats["ArXiv"]["error"] == "timeout"
+
+    # The only worker is free again for the next search, and the hung source was asked once
+    _, stats = fan_out("next search", ["SemanticScholar"], source_timeout=0.5, deadline=3)
+    assert stats["SemanticScholar"]["error"] is None
+    assert sum(n for path, n in stubs.paths.items() if "hung%20source" in path) == 1
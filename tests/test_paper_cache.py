@@ -0,0 +1,36 @@
+import os
+from benchmarks.corpus import make_pdf
+from utils import paper_cache
+from utils.doc_loader import parse_pdf, load_pdf
+
+
+def test_cached_paper_round_trips_without_extra_files():
+    chunks, figures, paragraphs = parse_pdf(make_pdf(3, 1, seed=7), "cached.pdf", workers=1)
+    index = load_pdf(chunks, figures, paragraphs, 3)
+    paper_cache.save_paper("round-trip", index.vectorstore, index.figures, index.sections)
+
+    assert sorted(os.listdir(os.path.join(paper_cache.CACHE_DIR, "round-trip"))) == [
+        "captions.npy", "faiss", "meta.json", "sections.json",
+    ]
+    # Nothing that is unpickled on load
+    assert sorted(os.listdir(os.path.join(paper_cache.CACHE_DIR, "round-trip", "faiss"))) == [
+        "docstore.json", "index.faiss",
+    ]
+    figures, vectorstore, sections = paper_cache.load_paper("round-trip", index.embeddings)
+    assert vectorstore.index.ntotal == index.vectorstore.index.ntotal
+    assert list(figures) == list(index.figures)
+    assert sections.sections == index.sections.sections
+    assert vectorstore.similarity_search("attention", k=2) == index.vectorstore.similarity_search("attention", k=2)
+
+
+def test_cache_directory_writable_by_others_is_not_used():
+    chunks, figures, paragraphs = parse_pdf(make_pdf(3, 1, seed=8), "shared.pdf", workers=1)
+    index = load_pdf(chunks, figures, paragraphs, 3)
+    paper_cache.save_paper("shared-dir", index.vectorstore, index.figures, index.sections)
+
+    os.chmod(paper_cache.CACHE_DIR, 0o777)
+    try:
+        assert paper_cache.load_paper("shared-dir", index.embeddings) is None
+    finally:
+        os.chmod(paper_cache.CACHE_DIR, 0o700)
+    assert paper_cache.load_paper("shared-dir", index.embeddings) is not None
@@ -0,0 +1,27 @@
+from langchain_core.documents import Document
+from benchmarks.fakes import HashEmbeddings
+from utils.paper_index import PaperIndex
+
+
+def test_lexical_hits_are_the_bare_chunks():
+    embeddings = HashEmbeddings()
+    texts = [
+        "Dropout of 0.1 is applied to every residual connection.",
+        "Results on ImageNet show a 2.1 point top-1 improvement.",
+    ]
+    paragraphs = [
+        {"heading": True, "text": "3 Training", "page": 0},
+        {"heading": False, "text": texts[0], "page": 0},
+        {"heading": True, "text": "4 Results", "page": 0},
+        {"heading": False, "text": texts[1], "page": 0},
+    ]
+    chunks = [
+        Document(page_content=texts[0], metadata={"page": 0, "paragraph": 1, "start_index": 0}),
+        Document(page_content=texts[1], metadata={"page": 0, "paragraph": 3, "start_index": 60}),
+    ]
+    index = PaperIndex(embeddings, 1)
+    index.add_batch(chunks, [], 1, paragraphs)
+
+    # "training" only matches the section title, so the hit is lexical-only
+    hits = index.hybrid_search("training", embeddings.embed_query("imagenet results"), k=2, k_vector=1)
+    assert sorted(doc.page_content for doc, _ in hits) == sorted(texts)
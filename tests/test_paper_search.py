@@ -0,0 +1,19 @@
+import time
+from agent.ToolPapSe import search_candidates
+
+
+def test_the_web_scraper_fallback_stays_within_the_deadline(stubs):
+    stubs.latencies.update(s2=0.01, arxiv=0.01, springer=0.01, google=0.01, web=2.0)
+    stubs.statuses.update(s2=404, arxiv=404, springer=404, google=404)
+
+    start = time.monotonic()
+    assert search_candidates("unfindable paper", deadline=0.5) == []
+    assert time.monotonic() - start < 1.0
+
+
+def test_the_web_scraper_fallback_answers_in_time(stubs):
+    stubs.latencies.update(s2=0.01, arxiv=0.01, springer=0.01, google=0.01, web=0.05)
+    stubs.statuses.update(s2=404, arxiv=404, springer=404, google=404)
+
+    papers = search_candidates("only on the web", deadline=2)
+    assert papers and all("web result" in paper["title"] for paper in papers)
@@ -0,0 +1,40 @@
+from utils.doc_loader import download_pdf
+from utils.paper_store import store
+
+
+def test_link_loaded_paper_is_accepted_by_the_pdf_viewer(stubs):
+    figures, pdf_file, handle = download_pdf(stubs.pdf_link(0))
+    try:
+        # streamlit_pdf_viewer.pdf_viewer passes its input through only when
+        # `type(input) is bytes` and otherwise tries to open() it as a path
+        assert type(pdf_file) is bytes
+        assert pdf_file.startswith(b"%PDF-")
+        # The viewer, figure decoding and the store share one copy
+        assert pdf_file is handle.pdf_bytes
+    finally:
+        handle.release()
+
+
+def test_sessions_opening_the_same_link_share_the_bytes(stubs):
+    _, first, a = download_pdf(stubs.pdf_link(1))
+    _, second, b = download_pdf(stubs.pdf_link(1))
+    try:
+        assert first is second
+    finally:
+        a.release()
+        b.release()
+
+
+def test_resident_size_is_computed_once_indexed(stubs):
+    _, _, handle = download_pdf(stubs.pdf_link(0))
+    try:
+        handle.done.wait()
+        resident = store.stats()["resident_bytes"]
+        entry = store._entries[handle.key]
+        assert entry.size is not None and entry.size <= resident
+        # Later calls read the cached size instead of walking the docstore again
+        entry.size += 1
+        assert store.stats()["resident_bytes"] == resident + 1
+        entry.size -= 1
+    finally:
+        handle.release()
@@ -0,0 +1,19 @@
+import os
+import tempfile
+from benchmarks.corpus import make_pdf
+from utils.doc_loader import parse_pdf, PARALLEL_MIN_PAGES, INCREMENTAL_MIN_PAGES
+
+
+def test_sharded_parsing_matches_one_process_and_cleans_up():
+    # Papers short enough to be parsed in one go must be able to shard
+    assert PARALLEL_MIN_PAGES <= INCREMENTAL_MIN_PAGES
+    pdf_bytes = make_pdf(PARALLEL_MIN_PAGES, 1, seed=3)
+    before = set(os.listdir(tempfile.gettempdir()))
+
+    chunks, figures, paragraphs = parse_pdf(pdf_bytes, "sharded.pdf", workers=2)
+    expected = parse_pdf(pdf_bytes, "sharded.pdf", workers=1)
+
+    assert [c.page_content for c in chunks] == [c.page_content for c in expected[0]]
+    assert [c.metadata for c in chunks] == [c.metadata for c in expected[0]]
+    assert list(figures) == list(expected[1]) and paragraphs == expected[2]
+    assert not {name for name in set(os.listdir(tempfile.gettempdir())) - before if name.endswith(".pdf")}
@@ -0,0 +1,71 @@
+import time
+from utils import doc_loader
+from utils.doc_loader import prefetch_papers, download_pdf
+from utils.paper_store import store
+
+
+def _wait_started(link, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not doc_loader._prefetches[link].future.running():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_a_search_does_not_cancel_another_sessions_prefetches(stubs):
+    shared, only_b = stubs.url + "/pdf/0.pdf?shared", stubs.url + "/pdf/1.pdf?b"
+    prefetch_papers([shared], owner="a")
+    prefetch_papers([shared, only_b], owner="b")
+    job = doc_loader._prefetches[only_b]
+
+    # Session a moves on to another search: b's prefetches stay
+    prefetch_papers([stubs.url + "/pdf/0.pdf?other"], owner="a")
+    assert not job.cancelled.is_set()
+    assert shared in doc_loader._prefetches
+
+    # Dropped by its last owner, a prefetch is cancelled
+    prefetch_papers([], owner="b")
+    assert job.cancelled.is_set()
+    assert shared not in doc_loader._prefetches and only_b not in doc_loader._prefetches
+    prefetch_papers([], owner="a")
+
+
+def test_opening_a_paper_still_downloading_waits_instead_of_fetching_again(stubs):
+    stubs.latencies["pdf"] = 0.5
+    link = stubs.url + "/pdf/1.pdf?in-flight"
+    prefetch_papers([link], owner="a")
+    _wait_started(link)
+
+    _, pdf_file, handle = download_pdf(link)
+    try:
+        assert pdf_file.startswith(b"%PDF-")
+        assert stubs.paths["/pdf/1.pdf?in-flight"] == 1  # the prefetch's download was reused
+    finally:
+        handle.release()
+
+
+def test_a_finished_prefetch_keeps_its_paper_in_the_store_not_the_job(stubs):
+    link = stubs.url + "/pdf/0.pdf?finished"
+    prefetch_papers([link], owner="a")
+    job = doc_loader._prefetches[link]
+    job.future.result(timeout=30)
+    assert job.pdf_bytes is None
+    held = store.acquire(job.key)
+    assert held is not None
+    held.release()
+
+    _, pdf_file, handle = download_pdf(link)
+    try:
+        assert pdf_file.startswith(b"%PDF-")
+        assert stubs.paths["/pdf/0.pdf?finished"] == 1
+    finally:
+        handle.release()
+
+
+def test_finished_prefetches_expire(stubs, monkeypatch):
+    link = stubs.url + "/pdf/1.pdf?closed-session"
+    prefetch_papers([link], owner="closed")
+    doc_loader._prefetches[link].future.result(timeout=30)
+
+    monkeypatch.setattr(doc_loader, "PREFETCH_TTL", 0)
+    prefetch_papers([], owner="other")
+    assert link not in doc_loader._prefetches
@@ -0,0 +1,25 @@
+from utils import search_cache
+from utils.search_cache import cached_search
+
+
+def _search(sources):
+    calls = []
+
+    def search(query):
+        calls.append(query)
+        return {"status": "success", "data": [{"title": query}], "sources": sources}
+    return search, calls
+
+
+def test_partial_results_expire_quickly_and_are_not_served_stale(monkeypatch):
+    search, calls = _search({"ArXiv": {"error": None}, "Springer": {"error": "timeout"}})
+    cached = cached_search("partial-test", ttl=3600)(search)
+
+    cached("sparse attention")
+    cached("sparse attention")
+    assert len(calls) == 1  # kept for SEARCH_TTL_PARTIAL
+
+    monkeypatch.setattr(search_cache, "SEARCH_TTL_PARTIAL", 0)
+    cached("sparse attention")
+    assert len(calls) == 2  # past it, searched again rather than served stale
+
@@ -0,0 +1,79 @@
+import json
+import time
+import pytest
+from utils import tracing
+
+
+@pytest.fixture
+def traced(tmp_path, monkeypatch):
+    path = tmp_path / "trace.jsonl"
+    monkeypatch.setattr(tracing, "TRACE_ENABLED", True)
+    monkeypatch.setattr(tracing, "TRACE_FILE", str(path))
+    return path
+
+
+def _lines(path, count, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        lines = path.read_text().splitlines() if path.exists() else []
+        if len(lines) >= count:
+            return [json.loads(line) for line in lines]
+        time.sleep(0.01)
+    raise AssertionError(f"expected {count} spans in {path}")
+
+
+def test_spans_are_written_as_json_lines_by_the_background_writer(traced):
+    with tracing.span("outer", paper="p") as outer:
+        with tracing.span("inner"):
+            pass
+        outer.set(hits=3)
+
+    inner, outer = _lines(traced, 2)
+    assert (inner["name"], outer["name"]) == ("inner", "outer")
+    assert inner["parent"] == outer["span"] and inner["trace"] == outer["trace"]
+    assert outer["paper"] == "p" and outer["hits"] == 3
+
+
+def test_the_trace_file_is_rotated(traced, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_FILE_MAX_BYTES", 500)
+    for i in range(20):
+        with tracing.span("rotated", i=i):
+            pass
+
+    deadline = time.monotonic() + 5
+    rotated = traced.with_name(traced.name + ".1")
+    while not rotated.exists():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert rotated.stat().st_size < 1000
+
+
+class _Rerun(BaseException):
+    """Like Streamlit's RerunException/StopException, which are not Exceptions."""
+
+
+def test_interruptions_are_not_counted_as_errors(traced):
+    with pytest.raises(_Rerun):
+        with tracing.span("interrupted.turn"):
+            raise _Rerun()
+
+    stream = tracing.trace_stream("interrupted.stream", iter("abc"))
+    next(stream)
+    stream.close()  # the reader stopped early: GeneratorExit inside the span
+
+    with pytest.raises(ValueError):
+        with tracing.span("interrupted.failed"):
+            raise ValueError("boom")
+
+    records = {record["name"]: record for record in tracing.recent_spans()}
+    assert records["interrupted.turn"]["interrupted"] == "_Rerun"
+    assert records["interrupted.stream"]["interrupted"] == "GeneratorExit"
+    assert "error" not in records["interrupted.turn"] and "error" not in records["interrupted.stream"]
+    assert records["interrupted.failed"]["error"] == "ValueError: boom"
+
+    errors = {row["name"]: row["errors"] for row in tracing.stage_stats()}
+    assert errors["interrupted.turn"] == errors["interrupted.stream"] == 0
+    assert errors["interrupted.failed"] == 1
+    metrics = tracing.prometheus_text()
+    assert 'researchio_stage_errors_total{stage="interrupted.turn"} 0' in metrics
+    assert 'researchio_stage_errors_total{stage="interrupted.failed"} 1' in metrics
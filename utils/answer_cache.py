@@ -0,0 +1,118 @@
+import os
+import time
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+
+# A question this similar to an earlier one, over the same context, reuses its answer
+ANSWER_CACHE_THRESHOLD = float(os.getenv('ANSWER_CACHE_THRESHOLD', '0.95'))
+ANSWER_CACHE_TTL = int(os.getenv('ANSWER_CACHE_TTL', str(24 * 3600)))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv('ANSWER_CACHE_MAX_ENTRIES', '2000'))
+# Replayed answers are streamed in pieces of this many words, this many seconds apart
+REPLAY_WORDS = 4
+REPLAY_DELAY = float(os.getenv('ANSWER_REPLAY_DELAY', '0.01'))
+
+
+def context_fingerprint(docs):
+    digest = hashlib.sha1()
+    for doc in docs:
+        digest.update(doc.page_content.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class AnswerCache:
+    """
+    Process-wide cache of answers per paper (its cache key, or the selected
+    library papers) and retrieval context. A question is a hit when an
+    earlier question on the same paper and context embeds within
+    ANSWER_CACHE_THRESHOLD cosine similarity. Entries expire after
+    ANSWER_CACHE_TTL seconds; the least recently used go first past
+    ANSWER_CACHE_MAX_ENTRIES.
+    """
+
+    def __init__(self, threshold=ANSWER_CACHE_THRESHOLD, ttl=ANSWER_CACHE_TTL, max_entries=ANSWER_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # (scope, context fingerprint) -> OrderedDict(entry id -> (question vector, answer, created))
+        self._entries = OrderedDict()
+        self._size = 0
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def get(self, scope, fingerprint, query_embedding):
+        """
+        Returns the cached answer for a similar question, or None.
+        """
+        now = time.time()
+        query = _unit(query_embedding)
+        with self._lock:
+            bucket = self._entries.get((scope, fingerprint))
+            best_id, best_score = None, self.threshold
+            for entry_id, (vector, _, created) in list((bucket or {}).items()):
+                if now - created > self.ttl:
+                    del bucket[entry_id]
+                    self._size -= 1
+                    continue
+                score = float(vector @ query)
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            bucket.move_to_end(best_id)
+            self._entries.move_to_end((scope, fingerprint))
+            return bucket[best_id][1]
+
+    def put(self, scope, fingerprint, query_embedding, answer):
+        with self._lock:
+            bucket = self._entries.setdefault((scope, fingerprint), OrderedDict())
+            self._entries.move_to_end((scope, fingerprint))
+            bucket[self._next_id] = (_unit(query_embedding), answer, time.time())
+            self._next_id += 1
+            self._size += 1
+
+            # Least recently used context first, its oldest question first
+            while self._size > self.max_entries:
+                key, oldest = next(iter(self._entries.items()))
+                if oldest:
+                    oldest.popitem(last=False)
+                    self._size -= 1
+                if not oldest:
+                    del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": self._size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def replay(answer, words=REPLAY_WORDS, delay=REPLAY_DELAY):
+    """
+    Yields a cached answer in small pieces, like a streamed LLM response.
+    """
+    pieces = answer.split(" ")
+    for i in range(0, len(pieces), words):
+        yield " ".join(pieces[i:i + words]) + (" " if i + words < len(pieces) else "")
+        if delay:
+            time.sleep(delay)
+
+
+answer_cache = AnswerCache()
@@ -0,0 +1,79 @@
+import re
+import math
+import numpy as np
+from collections import Counter, defaultdict
+
+# Keeps dotted and hyphenated terms such as "3.2", "gpt-4" or "f1-score" whole
+TOKEN_RE = re.compile(r"\w+(?:[.\-]\w+)*")
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """
+    In-memory Okapi BM25 inverted index over the same chunks as the FAISS
+    store. Catches exact terms (equation names, datasets, table numbers)
+    that dense retrieval tends to miss.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.docs = []
+        self.doc_lengths = []
+        self.postings = defaultdict(list)  # term -> [(doc index, term frequency)]
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, docs, texts=None):
+        """
+        Indexes `docs`, scoring each by its entry in `texts` when given
+        (e.g. the chunk with its section title); searches return the docs.
+        """
+        docs = list(docs)
+        for doc, text in zip(docs, texts if texts is not None else (doc.page_content for doc in docs)):
+            tokens = tokenize(text)
+            index = len(self.docs)
+            for term, tf in Counter(tokens).items():
+                self.postings[term].append((index, tf))
+            self.doc_lengths.append(len(tokens))
+            self.docs.append(doc)
+
+    def search(self, query, k=8):
+        """
+        Returns up to k (Document, score) pairs with a positive BM25 score.
+        """
+        n = len(self.docs)
+        if not n:
+            return []
+
+        lengths = np.asarray(self.doc_lengths, dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * lengths / max(lengths.mean(), 1.0))
+        scores = np.zeros(n, dtype=np.float32)
+
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idx, tf = np.asarray(posting, dtype=np.int64).T
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            scores[idx] += idf * tf * (self.k1 + 1) / (tf + norm[idx])
+
+        top = np.argsort(-scores)[:k]
+        return [(self.docs[i], float(scores[i])) for i in top if scores[i] > 0]
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Fuses several ranked lists of Documents by id: score = sum 1 / (k + rank).
+    Returns (Document, fused score) pairs, best first.
+    """
+    scores, docs = defaultdict(float), {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            scores[doc.id] += 1.0 / (k + rank)
+            docs.setdefault(doc.id, doc)
+
+    return sorted(((docs[i], s) for i, s in scores.items()), key=lambda x: x[1], reverse=True)
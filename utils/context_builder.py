@@ -0,0 +1,147 @@
+from langchain_core.documents import Document
+from utils.bm25 import tokenize
+
+# A span is a near-duplicate when this share of its word 3-grams is already in the context
+NEAR_DUPLICATE_CONTAINMENT = 0.8
+
+
+def estimate_tokens(text):
+    # ~4 characters per token for English prose; good enough for budgeting
+    return (len(text) + 3) // 4
+
+
+def _shingles(text, n=3):
+    tokens = tokenize(text)
+    return {tuple(tokens[i:i + n]) for i in range(max(len(tokens) - n + 1, 1))}
+
+
+def _overlap(a, b, max_overlap=400):
+    """
+    Length of the longest suffix of a that is a prefix of b.
+    """
+    for size in range(min(len(a), len(b), max_overlap), 0, -1):
+        if a.endswith(b[:size]):
+            return size
+    return 0
+
+
+def _merge_page(ranked):
+    """
+    Merges overlapping or adjacent chunks of one page, given as (rank, doc)
+    pairs, into contiguous spans. Chunks carry the splitter's start_index;
+    chunks without it are only merged when their texts overlap.
+
+    Returns (rank, span) pairs; a span ranks as the best chunk in it.
+    """
+    if all("start_index" in doc.metadata for _, doc in ranked):
+        ranked = sorted(ranked, key=lambda pair: pair[1].metadata["start_index"])
+
+    rank, first = ranked[0]
+    spans = [[first, first.page_content, first.metadata.get("start_index"), rank]]
+    for rank, doc in ranked[1:]:
+        _, text, start, best = spans[-1]
+        doc_start = doc.metadata.get("start_index")
+
+        if start is not None and doc_start is not None:
+            overlap = start + len(text) - doc_start
+            if overlap >= 0:
+                spans[-1][1] = text + doc.page_content[overlap:]
+                spans[-1][3] = min(best, rank)
+                continue
+        else:
+            overlap = _overlap(text, doc.page_content)
+            if overlap:
+                spans[-1][1] = text + doc.page_content[overlap:]
+                spans[-1][3] = min(best, rank)
+                continue
+
+        spans.append([doc, doc.page_content, doc_start, rank])
+
+    return [(best, Document(page_content=text, metadata=first.metadata)) for first, text, _, best in spans]
+
+
+def _expand_sections(packed, used, token_budget, sections):
+    """
+    Replaces paragraph spans with their whole parent section, best first,
+    while the section still fits in the remaining budget.
+    """
+    expanded = set()
+    for i in range(len(packed)):
+        span = packed[i]
+        if span is None:
+            continue
+        section_id = span.metadata.get("section_id")
+        if section_id in expanded or section_id not in sections:
+            continue
+
+        members = [j for j, other in enumerate(packed) if other is not None and other.metadata.get("section_id") == section_id]
+        text = sections.text(section_id)
+        extra = estimate_tokens(text) - sum(estimate_tokens(packed[j].page_content) for j in members)
+        if used + extra > token_budget:
+            continue
+
+        pages = sections.pages(section_id)
+        packed[i] = Document(page_content=text, metadata={**span.metadata, "page": pages[0], "pages": pages})
+        for j in members:
+            if j != i:
+                packed[j] = None
+        expanded.add(section_id)
+        used += extra
+
+    return [span for span in packed if span is not None], used
+
+
+def build_context(docs, token_budget, sections=None):
+    """
+    Turns ranked chunks into a compact context: merges overlapping chunks of
+    the same page, drops near-duplicates and packs the best spans, in rank
+    order, until token_budget is spent. When a SectionTree is given, spans
+    whose whole parent section still fits are expanded to that section.
+
+    Returns (docs, stats) where stats has the packed token count, the
+    tokens merging, deduplication and the budget saved against sending every
+    chunk verbatim, and the tokens section expansion added back.
+    """
+    raw_tokens = sum(estimate_tokens(doc.page_content) for doc in docs)
+    if not docs:
+        return [], {"tokens": 0, "raw_tokens": 0, "tokens_saved": 0, "expanded_tokens": 0, "dropped": 0}
+
+    # Chunks are merged per page, but spans are packed in the rank of their best chunk
+    pages = {}
+    for rank, doc in enumerate(docs):
+        pages.setdefault((doc.metadata.get("source"), doc.metadata.get("page")), []).append((rank, doc))
+    spans = [span for _, span in sorted(
+        (pair for ranked in pages.values() for pair in _merge_page(ranked)), key=lambda pair: pair[0]
+    )]
+
+    packed, seen, used, dropped = [], [], 0, 0
+    for span in spans:
+        shingles = _shingles(span.page_content)
+        if any(len(shingles & s) / len(shingles) >= NEAR_DUPLICATE_CONTAINMENT for s in seen):
+            dropped += 1
+            continue
+
+        tokens = estimate_tokens(span.page_content)
+        if used + tokens > token_budget:
+            if packed:
+                dropped += 1
+                continue
+            # Always keep the best span, trimmed to the budget
+            span = Document(page_content=span.page_content[:token_budget * 4], metadata=span.metadata)
+            tokens = estimate_tokens(span.page_content)
+
+        packed.append(span)
+        seen.append(shingles)
+        used += tokens
+
+    chunk_tokens = used
+    if sections is not None:
+        packed, used = _expand_sections(packed, used, token_budget, sections)
+
+    return packed, {
+        "tokens": used,
+        "raw_tokens": raw_tokens,
+        "tokens_saved": raw_tokens - chunk_tokens,
+        "expanded_tokens": used - chunk_tokens,
+        "dropped": dropped,
+    }
@@ -0,0 +1,210 @@
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils.bm25 import tokenize
+from utils.context_builder import estimate_tokens
+from utils.paper_cache import load_digest, save_digest
+from utils.sections import SectionTree
+from utils.tracing import span
+
+DIGEST_ENABLED = os.getenv('DIGEST_ENABLED', 'true').lower() == 'true'
+# One LLM call writes the overview; without it the abstract stands in
+DIGEST_LLM_OVERVIEW = os.getenv('DIGEST_LLM_OVERVIEW', 'true').lower() == 'true'
+DIGEST_PROMPT_TOKENS = 2500
+SECTION_SUMMARY_CHARS = 300
+MAX_FIGURES = 8
+MAX_EQUATIONS = 10
+
+OVERVIEW_RE = re.compile(
+    r"\b(summar(y|ise|ize)|overview|tl;?dr|main (idea|contribution|finding|point)s?|key (contribution|finding|idea)s?|"
+    r"what (is|'s) (this|the) paper about|what does (this|the) paper (do|propose|present))\b",
+    re.IGNORECASE,
+)
+# Words an overview question may have besides the phrase itself; any other
+# term ("results", "Table 2", "ablation") asks about part of the paper
+OVERVIEW_FILLER = set(
+    "a an the this that paper's paper article work study it its of in on for about and me us i you your "
+    "what is are was were does do did can could would please give tell write provide quick short brief "
+    "briefly overall whole entire main key".split()
+)
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+# A display equation: an equals sign or operator next to math, or a trailing "(n)" number
+EQUATION_RE = re.compile(r"(=|≤|≥|≈|∑|∏|∫|√|∂|∇).*|\(\d+\)\s*$")
+SKIPPED_SECTIONS = re.compile(r"^(\d+(\.\d+)*\s+)?(references|bibliography|acknowledg(e)?ments?)\b", re.IGNORECASE)
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="digest")
+_lock = threading.Lock()
+_digests = {}  # paper key -> digest dict
+_jobs = {}     # paper key -> Future
+
+
+def is_overview_query(query):
+    """
+    True for questions about the whole paper ("Can you summarize this
+    paper?", "tl;dr", "What are the main contributions?"), not for ones
+    that only use such a word ("Summarize the results in Table 2").
+    """
+    if not OVERVIEW_RE.search(query):
+        return False
+    return all(token in OVERVIEW_FILLER for token in tokenize(OVERVIEW_RE.sub(" ", query)))
+
+
+def _lead(text, max_chars=SECTION_SUMMARY_CHARS):
+    summary = ""
+    for sentence in SENTENCE_RE.split(" ".join(text.split())):
+        if summary and len(summary) + len(sentence) > max_chars:
+            break
+        summary = f"{summary} {sentence}".strip()
+    return summary[:max_chars]
+
+
+def _equations(sections):
+    found = []
+    for section in sections.sections.values():
+        for paragraph in section["paragraphs"]:
+            for line in paragraph.split("\n"):
+                line = line.strip()
+                # Short lines only: body sentences with an "=" are not display equations
+                if 3 < len(line) <= 120 and EQUATION_RE.search(line) and line not in found:
+                    found.append(line)
+                    if len(found) >= MAX_EQUATIONS:
+                        return found
+    return found
+
+
+def build_digest(sections, figures):
+    """
+    Extractive digest of a paper from its SectionTree and FigureIndex:
+    abstract, a lead-sentence summary per section, key figures with their
+    captions and display equations. No LLM involved.
+    """
+    abstract, section_summaries = "", []
+    for section_id, section in sections.sections.items():
+        text = " ".join(section["paragraphs"])
+        title = section["title"]
+        if not text or SKIPPED_SECTIONS.match(title):
+            continue
+        if not abstract and (title.lower().startswith("abstract") or title == SectionTree.FRONT_MATTER):
+            abstract = _lead(text, max_chars=1500)
+            continue
+        section_summaries.append({"title": title, "pages": section["pages"], "summary": _lead(text)})
+
+    if not abstract and section_summaries:
+        abstract = section_summaries[0]["summary"]
+
+    key_figures, seen = [], set()
+    for figure, caption in figures:
+        if caption in seen:
+            continue
+        seen.add(caption)
+        key_figures.append({"page": figure["page"], "caption": caption})
+        if len(key_figures) >= MAX_FIGURES:
+            break
+
+    return {
+        "overview": abstract,
+        "abstract": abstract,
+        "sections": section_summaries,
+        "figures": key_figures,
+        "equations": _equations(sections),
+    }
+
+
+def _overview_prompt(digest):
+    parts = [f"Abstract: {digest['abstract']}"]
+    for section in digest["sections"]:
+        parts.append(f"{section['title']}: {section['summary']}")
+    while len(parts) > 1 and estimate_tokens("\n".join(parts)) > DIGEST_PROMPT_TOKENS:
+        parts.pop()
+    text = "\n".join(parts)
+    return (
+        "Using only the paper outline below, write a short overview of the paper in 4-6 sentences: "
+        "the problem, the approach, the main results and the main contribution.\n\n" + text
+    )
+
+
+def render_digest(digest):
+    """
+    Markdown answer for overview questions.
+    """
+    lines = [digest["overview"]]
+    if digest["sections"]:
+        lines.append("\n**Sections**")
+        lines += [f"- **{s['title']}** (p. {s['pages'][0] + 1}): {s['summary']}" for s in digest["sections"]]
+    if digest["figures"]:
+        lines.append("\n**Key figures**")
+        lines += [f"- p. {f['page'] + 1}: {f['caption']}" for f in digest["figures"]]
+    if digest["equations"]:
+        lines.append("\n**Equations**")
+        lines += [f"- `{equation}`" for equation in digest["equations"]]
+    return "\n".join(lines)
+
+
+def get_digest(key):
+    """
+    The finished digest for a paper, or None; never waits for generation.
+    """
+    with _lock:
+        return _digests.get(key)
+
+
+def overview_answer(query, key):
+    """
+    The rendered digest when the query asks for an overview and the digest
+    of paper `key` is ready, else None.
+    """
+    if not key or not is_overview_query(query):
+        return None
+    digest = get_digest(key)
+    return render_digest(digest) if digest else None
+
+
+def _generate(index, llm):
+    # Waits for background indexing to finish; the digest covers the whole paper
+    while not index.done.wait(timeout=1.0):
+        if index.cancelled:
+            return
+    if index.error or index.cancelled:
+        return
+
+    key = index.key
+    with span("digest.build"):
+        digest = build_digest(index.sections, index.figures)
+    if DIGEST_LLM_OVERVIEW and llm is not None and digest["abstract"]:
+        try:
+            with span("digest.overview_llm"):
+                digest["overview"] = llm.invoke(_overview_prompt(digest)).content.strip() or digest["overview"]
+        except Exception:
+            pass  # the extractive abstract stays as the overview
+
+    with _lock:
+        _digests[key] = digest
+    try:
+        save_digest(key, digest)
+    except OSError:
+        pass
+
+
+def schedule_digest(index, llm=None):
+    """
+    Makes the digest of an opened paper available without blocking the
+    caller: from memory, from the paper cache, or generated in the
+    background once indexing has finished. Runs at most once per paper.
+    """
+    # A store handle is unwrapped so the job does not keep the session's hold
+    index = getattr(index, "index", index)
+    key = index.key
+    if not DIGEST_ENABLED or not key:
+        return
+
+    with _lock:
+        if key in _digests or (key in _jobs and not _jobs[key].done()):
+            return
+
+    stored = load_digest(key)
+    with _lock:
+        if stored is not None:
+            _digests[key] = stored
+        elif key not in _digests:
+            _jobs[key] = _executor.submit(_generate, index, llm)
@@ -1,124 +1,399 @@
 import os
-import io
 import fitz
+import time
 import tempfile
-import requests
-import numpy as np
-from PIL import Image
-from utils.embedding import load_model
-from langchain_community.vectorstores import FAISS
-from sklearn.metrics.pairwise import cosine_similarity
-from langchain_community.document_loaders import PyMuPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-
-def find_relevant_image(user_query, pdf_list):
-    if not pdf_list:
-        return None
+import threading
+from utils import http_client
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from utils.embedding import load_model, embedding_id
+from utils.paper_cache import paper_key, load_paper, save_paper
+from utils.paper_index import PaperIndex
+from utils.paper_store import store
+from utils.tracing import traced
+from utils.pdf_parser import (
+    CHUNK_SIZE, CHUNK_OVERLAP, CHUNKER_VERSION, parse_pages, parse_range
+)
 
-    # Step 1: Extract captions
-    captions = [caption for _, caption in pdf_list]
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', str(os.cpu_count() or 1)))
+# Papers longer than this are indexed incrementally in the background
+INCREMENTAL_MIN_PAGES = int(os.getenv('INDEX_INCREMENTAL_MIN_PAGES', '24'))
+# Papers parsed in one go (up to INCREMENTAL_MIN_PAGES pages) are sharded from this length
+PARALLEL_MIN_PAGES = int(os.getenv('INGEST_PARALLEL_MIN_PAGES', '16'))
+FIRST_BATCH_PAGES = int(os.getenv('INDEX_FIRST_BATCH_PAGES', '8'))
+BATCH_PAGES = int(os.getenv('INDEX_BATCH_PAGES', '8'))
 
-    embedding_model = load_model()
-    
-    # Step 2: Embed captions
-    caption_embeddings = embedding_model.embed_documents(captions)
+# How many ranked search candidates are downloaded and indexed ahead of time, and by how many threads
+PREFETCH_TOP_N = int(os.getenv('PREFETCH_TOP_N', '3'))
+PREFETCH_WORKERS = int(os.getenv('PREFETCH_WORKERS', '2'))
+# Finished prefetches are forgotten after this; their papers stay in the store until evicted
+PREFETCH_TTL = int(os.getenv('PREFETCH_TTL_S', '600'))
 
-    # Step 3: Embed user query
-    query_embedding = embedding_model.embed_query(user_query)
+# Downloads larger than this are aborted; they are streamed in chunks of DOWNLOAD_CHUNK_BYTES
+MAX_PDF_BYTES = int(os.getenv('MAX_PDF_MB', '100')) * 1024 * 1024
+DOWNLOAD_CHUNK_BYTES = 256 * 1024
+# The PDF header must appear within the first KiB of the file
+PDF_MAGIC = b'%PDF-'
+PDF_HEADER_BYTES = 1024
 
-    # Step 4: Compute cosine similarity
-    similarities = cosine_similarity([query_embedding], caption_embeddings)[0]
+IMAGE_SIMILARITY_THRESHOLD = 0.3
 
-    # Step 5: Get best matching image index
-    
-    if max(similarities) >= 0.3:
-        best_index = np.argmax(similarities)
-        return pdf_list[best_index][0]
-    return None
+def match_image(query_embedding, figures):
+    """
+    Returns (figure, score) for an already embedded query; figure is None
+    when no caption is similar enough. See figures.figure_image for pixels.
+    """
+    if not figures:
+        return None, 0.0
 
-def split_documents(documents, chunk_size=700, chunk_overlap=100):
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-    )
-    return splitter.split_documents(documents)
+    figure, score = figures.best_match(query_embedding)
+    if score >= IMAGE_SIMILARITY_THRESHOLD:
+        return figure, score
+    return None, score
 
 
-def load_pdf(file_path):
+@traced("load_pdf")
+def load_pdf(chunks, figures, paragraphs, total_pages):
     try:
-        loader = PyMuPDFLoader(file_path)
-        documents = split_documents(loader.load())
-        return FAISS.from_documents(documents, load_model())
+        index = PaperIndex(load_model(), total_pages)
+        index.add_batch(chunks, figures, total_pages, paragraphs)
+        index.done.set()
+        return index
     except Exception as e:
         raise RuntimeError(f"Failed to load and embed PDF: {e}")
 
 
-def load_img(file_path):
-    images_with_captions = []
+_executors = {}
+
+def _get_executor(workers):
+    # Spawned workers are kept alive across papers so their start-up cost is paid once
+    if workers not in _executors:
+        _executors[workers] = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executors[workers]
+
+
+@contextmanager
+def _shared_pdf(pdf_bytes):
+    """
+    Writes the PDF once to a private temporary file, so process-pool tasks
+    get its path and a page range instead of a pickled copy of the bytes each.
+    """
+    fd, path = tempfile.mkstemp(suffix=".pdf")
     try:
-        doc = fitz.open(file_path)
-
-        for page_number in range(len(doc)):
-            page = doc[page_number]
-            image_list = page.get_images(full=True)
-
-            for img_index, img in enumerate(image_list):
-                xref = img[0]
-                base_image = doc.extract_image(xref)
-                image_bytes = base_image["image"]
-
-                image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-                temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".jpg")
-                image.save(temp_file, format="JPEG")
-                temp_file_path = temp_file.name
-                temp_file.close()
-
-                caption = None
-                blocks = page.get_text("dict")["blocks"]
-                for b in blocks:
-                    if "lines" in b and b["type"] == 0:
-                        text = " ".join(
-                            [span["text"] for line in b["lines"] for span in line["spans"]]
-                        )
-                        if "figure" in text.lower() or "fig." in text.lower():
-                            caption = text
-                            break
-
-                if caption:
-                    images_with_captions.append([temp_file_path, caption])
-                else:
-                    os.remove(temp_file_path)
+        with os.fdopen(fd, "wb") as f:
+            f.write(pdf_bytes)
+        yield path
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _page_ranges(total_pages, shards):
+    size = -(-total_pages // shards)
+    return [(start, min(start + size, total_pages)) for start in range(0, total_pages, size)]
+
+
+@traced("parse_pdf")
+def parse_pdf(pdf_bytes, source, workers=INGEST_WORKERS):
+    """
+    Opens the PDF from memory and parses, chunks and extracts figures from
+    every page exactly once. Long documents are sharded into page ranges
+    across a process pool; shards are merged back in page order.
+
+    Returns (chunks, figures, paragraphs), see pdf_parser.parse_pages.
+    """
+    try:
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+            total_pages = len(doc)
+            if workers <= 1 or total_pages < PARALLEL_MIN_PAGES:
+                return parse_pages(doc, source, 0, total_pages)
+
+        ranges = _page_ranges(total_pages, workers)
+        with _shared_pdf(pdf_bytes) as path:
+            results = list(_get_executor(workers).map(
+                parse_range,
+                [path] * len(ranges),
+                [source] * len(ranges),
+                ranges,
+            ))
 
     except Exception as e:
-        raise RuntimeError(f"Failed to extract images: {e}")
+        raise RuntimeError(f"Failed to parse PDF: {e}")
+
+    chunks, images_with_captions, paragraphs = [], [], []
+    for shard_chunks, shard_images, shard_paragraphs in results:
+        # Paragraph references are shard-local; shift them past earlier shards
+        for chunk in shard_chunks:
+            chunk.metadata["paragraph"] += len(paragraphs)
+        chunks.extend(shard_chunks)
+        images_with_captions.extend(shard_images)
+        paragraphs.extend(shard_paragraphs)
+
+    return chunks, images_with_captions, paragraphs
+
+
+def _page_batches(pdf_bytes, source, ranges, workers):
+    """
+    Yields (chunks, figures, pages, paragraphs) for each page range in page order,
+    parsing ahead on the process pool when more than one worker is configured.
+    """
+    if workers <= 1:
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+            for start, end in ranges:
+                chunks, figures, paragraphs = parse_pages(doc, source, start, end)
+                yield chunks, figures, end - start, paragraphs
+        return
+
+    executor = _get_executor(workers)
+    with _shared_pdf(pdf_bytes) as path:
+        futures = [executor.submit(parse_range, path, source, r) for r in ranges]
+        try:
+            for (start, end), future in zip(ranges, futures):
+                chunks, figures, paragraphs = future.result()
+                yield chunks, figures, end - start, paragraphs
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def _cache_paper(key, index):
+    try:
+        save_paper(key, index.vectorstore, index.figures, index.sections)
+    except OSError:
+        pass  # a cache write failure must not fail the upload
+
+
+def index_incrementally(pdf_bytes, source, key, total_pages, workers=INGEST_WORKERS):
+    """
+    Indexes the first pages synchronously so the chat can start answering,
+    then keeps embedding the rest in the background.
+    """
+    first_end = min(FIRST_BATCH_PAGES, total_pages)
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        chunks, figures, paragraphs = parse_pages(doc, source, 0, first_end)
+
+    index = PaperIndex(load_model(), total_pages)
+    index.add_batch(chunks, figures, first_end, paragraphs)
+
+    ranges = [(start, min(start + BATCH_PAGES, total_pages)) for start in range(first_end, total_pages, BATCH_PAGES)]
+    index.run(
+        _page_batches(pdf_bytes, source, ranges, workers),
+        on_complete=lambda idx: _cache_paper(key, idx),
+    )
+    return index.figures, index
+
+
+def normalize_pdf_link(link):
+    # arXiv abstract pages link to the PDF under /pdf/
+    if 'arxiv' in link:
+        link = link.replace('/abs/', '/pdf/')
+    return link
+
 
-    return images_with_captions
+@traced("download_pdf.fetch")
+def _fetch(link, on_progress=None, max_bytes=MAX_PDF_BYTES):
+    """
+    Streams a PDF into a bytearray; the paper store turns it into the one
+    immutable copy the viewer and figure decoding share. Fails as soon as the size exceeds
+    max_bytes or the first KiB shows it is not a PDF (e.g. an HTML landing
+    page). on_progress(received, total) is called per chunk; total is None
+    when the server sends no Content-Length.
+    """
+    with http_client.get(link, stream=True) as response:
+        response.raise_for_status()
+        content_type = response.headers.get('Content-Type', 'unknown')
 
+        total = response.headers.get('Content-Length')
+        total = int(total) if total and total.isdigit() else None
+        if total is not None and total > max_bytes:
+            raise ValueError(f"PDF is {total / 2**20:.0f} MB, over the {max_bytes / 2**20:.0f} MB limit")
 
-def download_pdf(file: str, download=True):
-    tmp_path = None
+        data, checked = bytearray(), False
+        for chunk in response.iter_content(DOWNLOAD_CHUNK_BYTES):
+            data += chunk
+            if len(data) > max_bytes:
+                raise ValueError(f"PDF is over the {max_bytes / 2**20:.0f} MB limit")
+            if not checked and len(data) >= PDF_HEADER_BYTES:
+                if PDF_MAGIC not in data[:PDF_HEADER_BYTES]:
+                    raise ValueError(f"Link does not point to a PDF (got {content_type})")
+                checked = True
+            if on_progress:
+                on_progress(len(data), total)
+
+    if PDF_MAGIC not in data[:PDF_HEADER_BYTES]:
+        raise ValueError(f"Link does not point to a PDF (got {content_type})")
+    return data
+
+
+class _Prefetch:
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self.downloaded = threading.Event()  # set once pdf_bytes and total_pages are known, or the fetch failed
+        self.owners = set()  # sessions whose search still lists this link
+        self.pdf_bytes = None  # only while the job runs; a finished paper is in the store
+        self.total_pages = None
+        self.key = None
+        self.finished = None
+        self.future = None
+
+    def cancel(self):
+        self.cancelled.set()
+        self.future.cancel()
+
+
+_prefetch_executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+_prefetch_lock = threading.Lock()
+_prefetches = {}  # link -> _Prefetch
+
+
+def _prefetch_paper(link, job):
+    """
+    Downloads a candidate, indexes it into the paper cache, checking for
+    cancellation between page batches, and leaves it in the paper store
+    without holding it, so it is evicted like any unused paper. Parses in
+    this thread only, so the process pool stays free for the paper the
+    user actually opens.
+    """
+    try:
+        try:
+            job.pdf_bytes = _fetch(link)
+            with fitz.open(stream=job.pdf_bytes, filetype="pdf") as doc:
+                job.total_pages = len(doc)
+        finally:
+            job.downloaded.set()
+
+        key = paper_key(job.pdf_bytes, embedding_id(), CHUNK_SIZE, CHUNK_OVERLAP, CHUNKER_VERSION)
+        job.key = key
+        cached = load_paper(key, load_model())
+        if cached:
+            pdf_list, vectorstore, sections = cached
+            index = PaperIndex.from_vectorstore(vectorstore, pdf_list, sections, load_model())
+        else:
+            total_pages = job.total_pages
+            index = PaperIndex(load_model(), total_pages)
+            ranges = [(start, min(start + BATCH_PAGES, total_pages)) for start in range(0, total_pages, BATCH_PAGES)]
+            for chunks, figures, pages, paragraphs in _page_batches(job.pdf_bytes, link, ranges, workers=1):
+                if job.cancelled.is_set():
+                    return
+                index.add_batch(chunks, figures, pages, paragraphs)
+            index.done.set()
+            if index.vectorstore is None or job.cancelled.is_set():
+                return
+            _cache_paper(key, index)
+
+        if not job.cancelled.is_set():
+            index.key = key
+            store.put(key, index, job.pdf_bytes).release()
+    finally:
+        job.pdf_bytes = None
+        job.finished = time.monotonic()
+
+
+def prefetch_papers(links, owner=None):
+    """
+    Starts downloading and indexing the given candidate links, best first,
+    in the background, on behalf of owner (a session id). The owner's
+    earlier prefetches of links no longer among its candidates are dropped;
+    a prefetch is cancelled once no session wants it any more.
+    """
+    links = [normalize_pdf_link(link) for link in links[:PREFETCH_TOP_N]]
+    now = time.monotonic()
+    with _prefetch_lock:
+        for link, job in list(_prefetches.items()):
+            # Also covers the prefetches of sessions that closed
+            if job.finished is not None and now - job.finished > PREFETCH_TTL:
+                del _prefetches[link]
+            elif link not in links and owner in job.owners:
+                job.owners.discard(owner)
+                if not job.owners:
+                    del _prefetches[link]
+                    job.cancel()
+
+        for link in links:
+            job = _prefetches.get(link)
+            if job is None:
+                job = _prefetches[link] = _Prefetch()
+                job.future = _prefetch_executor.submit(_prefetch_paper, link, job)
+            job.owners.add(owner)
+
+
+def _take_prefetched(link):
+    """
+    Returns the prefetched bytes for link, or None when it was never
+    prefetched or had not started yet. A download in flight is waited for
+    rather than repeated. Then a short paper still being indexed is waited
+    for too, since redoing it would take as long; a long one is cancelled
+    and the caller indexes it incrementally. A finished one is read back
+    from the paper store, if it was not evicted since.
+    """
+    with _prefetch_lock:
+        job = _prefetches.pop(link, None)
+    if job is None or job.future.cancel():
+        return None
+
+    job.downloaded.wait()
+    pdf_bytes = job.pdf_bytes
+    if job.total_pages is not None and job.total_pages <= INCREMENTAL_MIN_PAGES:
+        try:
+            job.future.result()
+        except Exception:
+            pass
+    else:
+        job.cancel()
+
+    if pdf_bytes is None and job.key is not None:
+        handle = store.acquire(job.key)
+        if handle is not None:
+            pdf_bytes = handle.pdf_bytes
+            handle.release()
+    return pdf_bytes
+
+
+@traced("download_pdf")
+def download_pdf(file: str, download=True, on_progress=None):
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-            if download:
-                response = requests.get(file)
-                response.raise_for_status()
-                tmp_file.write(response.content)
-                tmp_path = tmp_file.name
+        if download:
+            file = normalize_pdf_link(file)
+            pdf_bytes = _take_prefetched(file) or _fetch(file, on_progress)
+            source = file
+        else:
+            pdf_bytes = file.read()
+            source = getattr(file, "name", "uploaded.pdf")
+
+        key = paper_key(pdf_bytes, embedding_id(), CHUNK_SIZE, CHUNK_OVERLAP, CHUNKER_VERSION)
+        # Another session may already hold this paper in memory
+        handle = store.acquire(key)
+
+        if handle is None:
+            cached = load_paper(key, load_model())
+
+            if cached:
+                pdf_list, vectorstore, sections = cached
+                vectorstore = PaperIndex.from_vectorstore(vectorstore, pdf_list, sections, load_model())
             else:
-                tmp_file.write(file.read())
-                tmp_path = tmp_file.name
+                with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+                    total_pages = len(doc)
 
-        vectorstore = load_pdf(tmp_path)
-        pdf_list = load_img(tmp_path)
+                if total_pages > INCREMENTAL_MIN_PAGES:
+                    pdf_list, vectorstore = index_incrementally(pdf_bytes, source, key, total_pages)
+                else:
+                    chunks, figures, paragraphs = parse_pdf(pdf_bytes, source)
+                    vectorstore = load_pdf(chunks, figures, paragraphs, total_pages)
+                    _cache_paper(key, vectorstore)
+
+            vectorstore.key = key
+            handle = store.put(key, vectorstore, pdf_bytes)
 
     except Exception as e:
         raise RuntimeError(f"Failed to process PDF: {e}")
 
-    finally:
-        if tmp_path and os.path.exists(tmp_path):
-            os.remove(tmp_path)
-
+    # Sessions get the shared figures and bytes, not their own copies
     if download:
-        return pdf_list, response.content, vectorstore
+        return handle.figures, handle.pdf_bytes, handle
     else:
-        return pdf_list, vectorstore
+        return handle.figures, handle
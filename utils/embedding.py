@@ -1,7 +1,43 @@
+import os
 import streamlit as st
 from langchain_huggingface import HuggingFaceEmbeddings
     
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+# torch | onnx | onnx-int8 (the ONNX backends need `optimum[onnxruntime]`)
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch')
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '64'))
+# Quantized weights shipped with the model repo; use model_qint8_arm64.onnx on ARM
+ONNX_INT8_FILE = os.getenv('EMBEDDING_ONNX_INT8_FILE', 'onnx/model_qint8_avx2.onnx')
+
+BACKENDS = ('torch', 'onnx', 'onnx-int8')
+
+
+def _backend_kwargs(backend):
+    if backend == 'torch':
+        return {}
+    if backend == 'onnx':
+        return {'backend': 'onnx'}
+    if backend == 'onnx-int8':
+        return {'backend': 'onnx', 'model_kwargs': {'file_name': ONNX_INT8_FILE}}
+    raise ValueError(f"Unknown embedding backend '{backend}', expected one of {BACKENDS}")
+
+
+def embedding_id(backend=EMBEDDING_BACKEND):
+    """
+    Identifies the vectors a backend produces; stored indexes are keyed by it.
+    """
+    return MODEL_NAME if backend == 'torch' else f"{MODEL_NAME}:{backend}"
+
+
+def build_model(backend=EMBEDDING_BACKEND, batch_size=EMBEDDING_BATCH_SIZE):
+    return HuggingFaceEmbeddings(
+        model_name=MODEL_NAME,
+        model_kwargs=_backend_kwargs(backend),
+        encode_kwargs={'batch_size': batch_size},
+    )
+
 
 @st.cache_resource
 def load_model():
-    return HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
\ No newline at end of file
+    return build_model()
@@ -0,0 +1,134 @@
+import io
+import os
+import fitz
+import threading
+import numpy as np
+from PIL import Image
+from collections import OrderedDict
+from utils.tracing import traced
+
+# Decoded figures are kept as JPEG bytes in a process-wide LRU of this size
+FIGURE_CACHE_MAX_BYTES = int(os.getenv('FIGURE_CACHE_MAX_MB', '64')) * 1024 * 1024
+# Resolution for figures that have to be rendered from the page instead
+FIGURE_RENDER_DPI = 150
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class FigureIndex:
+    """
+    The [figure, caption] pairs of a paper plus a normalized matrix of
+    their caption embeddings, computed once at ingestion. A figure is a
+    {"page", "xref", "bbox"} record; see figure_image for its pixels.
+    Iterates like the plain pdf_list it replaces.
+    """
+
+    def __init__(self, figures=(), vectors=None):
+        figures = [list(fig) for fig in figures]
+        if vectors is None:
+            vectors = np.empty((0, 0), dtype=np.float32)
+        # Swapped as one tuple so a background add never exposes mismatched rows
+        self._state = (figures, np.asarray(vectors, dtype=np.float32))
+
+    @classmethod
+    def build(cls, figures, embeddings):
+        index = cls()
+        index.add(figures, embeddings)
+        return index
+
+    def add(self, figures, embeddings):
+        if not figures:
+            return
+
+        # Figures on the same page often share a caption; embed each text once
+        captions = list(dict.fromkeys(caption for _, caption in figures))
+        by_caption = dict(zip(captions, _normalize(embeddings.embed_documents(captions))))
+        new_vectors = np.stack([by_caption[caption] for _, caption in figures])
+
+        old_figures, old_vectors = self._state
+        if len(old_figures):
+            new_vectors = np.vstack([old_vectors, new_vectors])
+        self._state = (old_figures + [list(fig) for fig in figures], new_vectors)
+
+    @property
+    def vectors(self):
+        return self._state[1]
+
+    def __len__(self):
+        return len(self._state[0])
+
+    def __iter__(self):
+        return iter(self._state[0])
+
+    def __getitem__(self, i):
+        return self._state[0][i]
+
+    def best_match(self, query_vector):
+        """
+        Returns (figure record, cosine score) of the closest caption, or (None, 0.0).
+        """
+        figures, vectors = self._state
+        if not figures:
+            return None, 0.0
+
+        scores = vectors @ _normalize([query_vector])[0]
+        best_index = int(np.argmax(scores))
+        return figures[best_index][0], float(scores[best_index])
+
+
+_image_cache = OrderedDict()
+_image_cache_bytes = 0
+_image_cache_lock = threading.Lock()
+
+
+@traced("figure_image.render")
+def _render(pdf_bytes, figure):
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        if figure["xref"]:
+            try:
+                image = Image.open(io.BytesIO(doc.extract_image(figure["xref"])["image"]))
+                image.load()
+            except Exception:
+                image = None  # e.g. JBIG2 or JPX streams PIL cannot read
+        else:
+            image = None  # inline image, only reachable by rendering
+        if image is None:
+            pixmap = doc[figure["page"]].get_pixmap(clip=fitz.Rect(figure["bbox"]), dpi=FIGURE_RENDER_DPI)
+            image = Image.open(io.BytesIO(pixmap.tobytes("png")))
+
+    out = io.BytesIO()
+    image.convert("RGB").save(out, format="JPEG")
+    return out.getvalue()
+
+
+@traced("figure_image")
+def figure_image(pdf_bytes, figure, paper_key):
+    """
+    JPEG bytes of a figure record, decoded from the PDF on first use and
+    then served from the LRU cache. Returns None if it cannot be decoded.
+    """
+    global _image_cache_bytes
+    cache_key = (paper_key, figure["page"], figure["xref"], tuple(figure["bbox"]))
+    with _image_cache_lock:
+        if cache_key in _image_cache:
+            _image_cache.move_to_end(cache_key)
+            return _image_cache[cache_key]
+
+    try:
+        jpeg = _render(pdf_bytes, figure)
+    except Exception:
+        return None
+
+    with _image_cache_lock:
+        if cache_key not in _image_cache:
+            _image_cache[cache_key] = jpeg
+            _image_cache_bytes += len(jpeg)
+        while _image_cache_bytes > FIGURE_CACHE_MAX_BYTES and len(_image_cache) > 1:
+            _, evicted = _image_cache.popitem(last=False)
+            _image_cache_bytes -= len(evicted)
+    return jpeg
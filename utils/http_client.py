@@ -0,0 +1,62 @@
+import os
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '30'))
+HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', '3'))
+HTTP_BACKOFF = float(os.getenv('HTTP_BACKOFF', '0.5'))
+# Longest Retry-After we are willing to sleep for before giving up
+MAX_RETRY_AFTER = float(os.getenv('HTTP_MAX_RETRY_AFTER', '10'))
+POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '16'))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class _CappedRetry(Retry):
+    """
+    Honours Retry-After, but never sleeps longer than MAX_RETRY_AFTER.
+    A rate-limited request then fails quickly with its 429 response.
+    """
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, MAX_RETRY_AFTER)
+
+
+def _build_session(retries=HTTP_RETRIES):
+    retry = _CappedRetry(
+        total=retries,
+        backoff_factor=HTTP_BACKOFF,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        respect_retry_after_header=True,
+        # Hand the last 429/5xx back to the caller instead of raising MaxRetryError
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# One process-wide session: connections are kept alive and pooled per host
+session = _build_session()
+# For calls bounded by a deadline of their own, where a retry would outlive it
+single_try_session = _build_session(retries=0)
+
+
+def get(url, timeout=None, retry=True, **kwargs):
+    """
+    requests.get through the shared session, with default (connect, read)
+    timeouts and bounded exponential-backoff retries for 429 and 5xx.
+    With retry=False the request is tried once.
+    """
+    return (session if retry else single_try_session).get(
+        url, timeout=timeout or (CONNECT_TIMEOUT, READ_TIMEOUT), **kwargs
+    )
@@ -0,0 +1,285 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import tempfile
+import threading
+import numpy as np
+import faiss
+from contextlib import contextmanager
+from langchain_core.documents import Document
+from utils.bm25 import tokenize, reciprocal_rank_fusion
+from utils.embedding import embedding_id
+
+LIBRARY_DIR = os.getenv('LIBRARY_DIR', os.path.join(tempfile.gettempdir(), 'researchio_library'))
+# Exact search up to this many chunks, then an IVF index trained on the library
+LIBRARY_IVF_MIN_VECTORS = int(os.getenv('LIBRARY_IVF_MIN_VECTORS', '50000'))
+LIBRARY_NPROBE = int(os.getenv('LIBRARY_NPROBE', '16'))
+
+
+def _normalize(vectors):
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def _fts_query(query):
+    return " OR ".join(f'"{term}"' for term in dict.fromkeys(tokenize(query)))
+
+
+class Library:
+    """
+    Persistent index over the chunks of many papers. One FAISS index holds
+    every chunk vector, with the SQLite row id of the chunk as its FAISS id;
+    SQLite keeps the papers, the chunk texts and metadata, and an FTS5 table
+    for the lexical side of hybrid search.
+
+    Readers memory-map the index file, so every session and process shares
+    one copy through the page cache. Writers rebuild the file next to it and
+    swap it in atomically; readers pick the new file up on their next search.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = os.path.join(path, 'index.faiss')
+        self._index = None
+        self._index_version = None
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        with self._db() as conn:
+            conn.executescript(
+                "PRAGMA journal_mode=WAL;"
+                "CREATE TABLE IF NOT EXISTS papers ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT UNIQUE, title TEXT, source TEXT, "
+                "chunks INTEGER, added REAL);"
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, paper_id INTEGER, text TEXT, metadata TEXT);"
+                "CREATE INDEX IF NOT EXISTS chunks_paper ON chunks (paper_id);"
+                "CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(text, paper_id UNINDEXED);"
+            )
+
+    @contextmanager
+    def _db(self):
+        conn = sqlite3.connect(os.path.join(self.path, 'library.sqlite'), timeout=10)
+        try:
+            with conn:  # commits on success
+                yield conn
+        finally:
+            conn.close()
+
+    # ------------------------ papers ------------------------
+
+    def papers(self):
+        """
+        Returns [{id, key, title, source, chunks, added}], oldest first.
+        """
+        with self._db() as conn:
+            rows = conn.execute("SELECT id, key, title, source, chunks, added FROM papers ORDER BY id").fetchall()
+        return [dict(zip(("id", "key", "title", "source", "chunks", "added"), row)) for row in rows]
+
+    def paper_id(self, key):
+        with self._db() as conn:
+            row = conn.execute("SELECT id FROM papers WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def add_paper(self, key, title, vectorstore):
+        """
+        Adds a paper from its finished FAISS store, reusing the vectors it
+        already holds. Returns the paper id; adding the same key twice is a no-op.
+        """
+        existing = self.paper_id(key)
+        if existing is not None:
+            return existing
+
+        store_ids = [vectorstore.index_to_docstore_id[i] for i in range(vectorstore.index.ntotal)]
+        docs = [vectorstore.docstore.search(store_id) for store_id in store_ids]
+        vectors = _normalize(vectorstore.index.reconstruct_n(0, len(store_ids)))
+        source = docs[0].metadata.get("source") if docs else None
+
+        with self._lock:
+            with self._db() as conn:
+                cursor = conn.execute(
+                    "INSERT INTO papers (key, title, source, chunks, added) VALUES (?, ?, ?, ?, ?)",
+                    (key, title, source, len(docs), time.time()),
+                )
+                paper_id = cursor.lastrowid
+                chunk_ids = []
+                for doc in docs:
+                    cursor = conn.execute(
+                        "INSERT INTO chunks (paper_id, text, metadata) VALUES (?, ?, ?)",
+                        (paper_id, doc.page_content, json.dumps(doc.metadata)),
+                    )
+                    chunk_ids.append(cursor.lastrowid)
+                    section = doc.metadata.get("section")
+                    conn.execute(
+                        "INSERT INTO chunks_fts (rowid, text, paper_id) VALUES (?, ?, ?)",
+                        (cursor.lastrowid, f"{section}\n{doc.page_content}" if section else doc.page_content, paper_id),
+                    )
+
+                if chunk_ids:
+                    self._write_index(lambda index: self._add_vectors(index, vectors, np.asarray(chunk_ids, dtype=np.int64)))
+        return paper_id
+
+    def remove_paper(self, paper_id):
+        with self._lock:
+            with self._db() as conn:
+                chunk_ids = [row[0] for row in conn.execute("SELECT id FROM chunks WHERE paper_id = ?", (paper_id,))]
+                conn.execute("DELETE FROM chunks WHERE paper_id = ?", (paper_id,))
+                conn.execute("DELETE FROM chunks_fts WHERE paper_id = ?", (paper_id,))
+                conn.execute("DELETE FROM papers WHERE id = ?", (paper_id,))
+
+                if chunk_ids:
+                    ids = np.asarray(chunk_ids, dtype=np.int64)
+                    self._write_index(lambda index: self._remove_vectors(index, ids))
+
+    # ------------------------ FAISS file ------------------------
+
+    def _add_vectors(self, index, vectors, ids):
+        if index is None:
+            index = faiss.IndexIDMap2(faiss.IndexFlatIP(vectors.shape[1]))
+
+        if isinstance(index, faiss.IndexIDMap2) and index.ntotal + len(ids) >= LIBRARY_IVF_MIN_VECTORS:
+            # Retrain as IVF once exact search gets too slow
+            old_ids = faiss.vector_to_array(index.id_map).astype(np.int64)
+            old_vectors = index.index.reconstruct_n(0, index.ntotal)
+            vectors, ids = np.vstack([old_vectors, vectors]), np.concatenate([old_ids, ids])
+
+            dim = vectors.shape[1]
+            nlist = max(int(4 * np.sqrt(len(ids))), 1)
+            index = faiss.IndexIVFFlat(faiss.IndexFlatIP(dim), dim, nlist, faiss.METRIC_INNER_PRODUCT)
+            index.train(vectors)
+
+        index.add_with_ids(vectors, ids)
+        return index
+
+    def _remove_vectors(self, index, ids):
+        if index is not None:
+            index.remove_ids(ids)
+        return index
+
+    def _write_index(self, update):
+        """
+        Applies update(writable copy of the index) and atomically replaces the file.
+        """
+        current = faiss.read_index(self.index_path) if os.path.exists(self.index_path) else None
+        index = update(current)
+        if index is None:
+            return
+
+        staging = f"{self.index_path}.{os.getpid()}.tmp"
+        faiss.write_index(index, staging)
+        os.replace(staging, self.index_path)
+
+    def _reader(self):
+        """
+        The memory-mapped index, reopened when another writer replaced the file.
+        """
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            return None
+        # Writers replace the file, so a new inode means a new index
+        version = (stat.st_ino, stat.st_mtime_ns)
+        if version != self._index_version:
+            self._index = faiss.read_index(self.index_path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+            self._index_version = version
+        return self._index
+
+    # ------------------------ search ------------------------
+
+    def _documents(self, conn, chunk_ids):
+        if not chunk_ids:
+            return {}
+        marks = ",".join("?" * len(chunk_ids))
+        rows = conn.execute(
+            f"SELECT chunks.id, chunks.text, chunks.metadata, papers.id, papers.title "
+            f"FROM chunks JOIN papers ON papers.id = chunks.paper_id WHERE chunks.id IN ({marks})",
+            list(chunk_ids),
+        )
+        return {
+            chunk_id: Document(
+                id=str(chunk_id), page_content=text,
+                metadata={**json.loads(metadata), "paper_id": paper_id, "paper": title},
+            )
+            for chunk_id, text, metadata, paper_id, title in rows
+        }
+
+    def hybrid_search(self, query, embedding, paper_ids, k=4, k_vector=8, k_lexical=8, rrf_k=60):
+        """
+        Hybrid search restricted to paper_ids: FAISS hits for `embedding` and
+        FTS5 BM25 hits for `query`, fused by reciprocal rank.
+        Returns (Document, fused score) pairs; metadata carries paper_id and paper.
+        """
+        with self._lock:
+            index = self._reader()
+        if index is None or not paper_ids:
+            return []
+
+        paper_marks = ",".join("?" * len(paper_ids))
+        with self._db() as conn:
+            ids = np.fromiter(
+                (row[0] for row in conn.execute(f"SELECT id FROM chunks WHERE paper_id IN ({paper_marks})", list(paper_ids))),
+                dtype=np.int64,
+            )
+            if not len(ids):
+                return []
+
+            selector = faiss.IDSelectorBatch(ids)
+            if isinstance(index, faiss.IndexIVF):
+                params = faiss.SearchParametersIVF(sel=selector, nprobe=LIBRARY_NPROBE)
+            else:
+                params = faiss.SearchParameters(sel=selector)
+            _, hits = index.search(_normalize([embedding]), k_vector, params=params)
+            vector_ids = [int(i) for i in hits[0] if i != -1]
+
+            lexical_ids = []
+            fts_query = _fts_query(query)
+            if k_lexical and fts_query:
+                lexical_ids = [row[0] for row in conn.execute(
+                    f"SELECT rowid FROM chunks_fts WHERE chunks_fts MATCH ? AND paper_id IN ({paper_marks}) "
+                    f"ORDER BY bm25(chunks_fts) LIMIT ?",
+                    [fts_query, *paper_ids, k_lexical],
+                )]
+
+            docs = self._documents(conn, set(vector_ids) | set(lexical_ids))
+
+        fused = reciprocal_rank_fusion(
+            [[docs[i] for i in vector_ids if i in docs], [docs[i] for i in lexical_ids if i in docs]], k=rrf_k
+        )
+        return fused[:k]
+
+    def select(self, paper_ids):
+        return LibrarySelection(self, paper_ids)
+
+
+class LibrarySelection:
+    """
+    The papers a chat is restricted to. Searches like a PaperIndex, so
+    retrieval can use either; sections are per paper and not expanded here.
+    """
+
+    sections = None
+
+    def __init__(self, library, paper_ids):
+        self.library = library
+        self.paper_ids = list(paper_ids)
+
+    def hybrid_search(self, query, embedding, k=4, k_vector=8, k_lexical=8, rrf_k=60):
+        return self.library.hybrid_search(query, embedding, self.paper_ids, k, k_vector, k_lexical, rrf_k)
+
+
+_libraries = {}
+_libraries_lock = threading.Lock()
+
+def get_library(model_name=None):
+    """
+    The process-wide library for an embedding model; vectors of different
+    models never share an index.
+    """
+    model_name = model_name or embedding_id()
+    with _libraries_lock:
+        if model_name not in _libraries:
+            path = os.path.join(LIBRARY_DIR, hashlib.sha256(model_name.encode()).hexdigest()[:12])
+            _libraries[model_name] = Library(path)
+        return _libraries[model_name]
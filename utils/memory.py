@@ -0,0 +1,93 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from langchain.memory.prompt import SUMMARY_PROMPT
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, get_buffer_string
+from utils.context_builder import estimate_tokens
+
+# Summaries are written off the request path, one at a time per memory
+MEMORY_SUMMARY_WORKERS = int(os.getenv('MEMORY_SUMMARY_WORKERS', '4'))
+# Summaries waiting for a worker, across sessions; past it a session keeps its
+# turns verbatim and tries again on its next save instead of queueing
+MEMORY_SUMMARY_QUEUE = int(os.getenv('MEMORY_SUMMARY_QUEUE', '16'))
+
+_executor = ThreadPoolExecutor(max_workers=MEMORY_SUMMARY_WORKERS, thread_name_prefix="memory")
+_queue_lock = threading.Lock()
+_queued = 0
+
+
+class RollingMemory:
+    """
+    Conversation memory with the interface myapp used from
+    ConversationSummaryBufferMemory: recent turns are kept verbatim up to
+    max_token_limit (estimated locally), older turns are folded into a
+    running summary by a background worker.
+
+    Reads never wait for the LLM. Turns that left the window but are not in
+    the summary yet are still returned verbatim until their summary lands.
+    """
+
+    def __init__(self, llm, max_token_limit=600):
+        self.llm = llm
+        self.max_token_limit = max_token_limit
+        self.summary = ""
+        self.error = None
+        self._recent = []   # messages inside the window
+        self._pending = []  # messages out of the window, awaiting the summary
+        self._running = False
+        self._generation = 0  # bumped by clear() to drop in-flight summaries
+        self._lock = threading.Lock()
+
+    def load_memory_variables(self, inputs=None):
+        with self._lock:
+            history = [SystemMessage(content=self.summary)] if self.summary else []
+            return {"history": history + self._pending + self._recent}
+
+    def save_context(self, inputs, outputs):
+        with self._lock:
+            self._recent += [HumanMessage(content=inputs["input"]), AIMessage(content=outputs["output"])]
+            while len(self._recent) > 2 and self._tokens(self._recent) > self.max_token_limit:
+                self._pending += self._recent[:2]
+                self._recent = self._recent[2:]
+            if self._pending and not self._running:
+                self._schedule()
+
+    def clear(self):
+        with self._lock:
+            self.summary = ""
+            self._recent, self._pending = [], []
+            self._generation += 1
+
+    def _tokens(self, messages):
+        return sum(estimate_tokens(message.content) for message in messages)
+
+    def _schedule(self):
+        # Called with the lock held
+        global _queued
+        with _queue_lock:
+            if _queued >= MEMORY_SUMMARY_QUEUE:
+                return
+            _queued += 1
+        self._running = True
+        _executor.submit(self._summarize, self._generation, self.summary, list(self._pending))
+
+    def _summarize(self, generation, summary, messages):
+        global _queued
+        with _queue_lock:
+            _queued -= 1
+        try:
+            prompt = SUMMARY_PROMPT.format(summary=summary, new_lines=get_buffer_string(messages))
+            new_summary = self.llm.invoke(prompt).content
+        except Exception as e:
+            new_summary, self.error = None, e  # keep the turns verbatim and retry on the next save
+
+        with self._lock:
+            self._running = False
+            current = generation == self._generation
+            if current and new_summary is not None:
+                self.summary = new_summary
+                self._pending = self._pending[len(messages):]
+                self.error = None
+            # After a failure, wait for the next save instead of retrying in a loop
+            if self._pending and (not current or new_summary is not None):
+                self._schedule()
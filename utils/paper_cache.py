@@ -0,0 +1,199 @@
+import os
+import json
+import time
+import faiss
+import shutil
+import getpass
+import hashlib
+import tempfile
+import numpy as np
+from langchain_core.documents import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from utils.figures import FigureIndex
+from utils.sections import SectionTree
+
+# Per user and private: entries are trusted on load, and keys can be derived from public PDFs
+CACHE_DIR = os.getenv('PAPER_CACHE_DIR', os.path.join(tempfile.gettempdir(), f'researchio_papers-{getpass.getuser()}'))
+CACHE_MAX_BYTES = int(os.getenv('PAPER_CACHE_MAX_MB', '1024')) * 1024 * 1024
+# Bump when stored entries change layout or content (e.g. figure captions); older entries are dropped on load
+CACHE_FORMAT = 4
+
+
+def paper_key(pdf_bytes, model_name, chunk_size, chunk_overlap, chunker):
+    """
+    Cache key for a processed paper: content hash of the PDF plus everything
+    that changes the stored chunks or vectors.
+    """
+    content_hash = hashlib.sha256(pdf_bytes).hexdigest()
+    params = f"{model_name}|{chunk_size}|{chunk_overlap}|{chunker}"
+    return content_hash[:32] + '-' + hashlib.sha256(params.encode()).hexdigest()[:12]
+
+
+def _entry_path(key):
+    return os.path.join(CACHE_DIR, key)
+
+
+def _private_dir():
+    """
+    Creates CACHE_DIR with mode 0700. False when it already exists but
+    belongs to another user or others can write to it; the cache is then
+    not used.
+    """
+    os.makedirs(CACHE_DIR, mode=0o700, exist_ok=True)
+    st = os.stat(CACHE_DIR)
+    if hasattr(os, 'getuid') and st.st_uid != os.getuid():
+        return False
+    return not st.st_mode & 0o022
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _touch(path):
+    # Directory mtime doubles as the last-access time for LRU eviction.
+    now = time.time()
+    os.utime(path, (now, now))
+
+
+def has_paper(key):
+    return os.path.isfile(os.path.join(_entry_path(key), 'meta.json'))
+
+
+def _save_vectorstore(vectorstore, path):
+    # The index and a JSON docstore, in index order; no pickles to load back
+    os.makedirs(path)
+    faiss.write_index(vectorstore.index, os.path.join(path, 'index.faiss'))
+    docs = []
+    for i in range(vectorstore.index.ntotal):
+        doc_id = vectorstore.index_to_docstore_id[i]
+        doc = vectorstore.docstore.search(doc_id)
+        docs.append({'id': doc_id, 'page_content': doc.page_content, 'metadata': doc.metadata})
+    with open(os.path.join(path, 'docstore.json'), 'w') as f:
+        json.dump(docs, f)
+
+
+def _load_vectorstore(path, embeddings):
+    index = faiss.read_index(os.path.join(path, 'index.faiss'))
+    with open(os.path.join(path, 'docstore.json')) as f:
+        docs = json.load(f)
+    docstore = InMemoryDocstore({
+        doc['id']: Document(id=doc['id'], page_content=doc['page_content'], metadata=doc['metadata'])
+        for doc in docs
+    })
+    return FAISS(embeddings, index, docstore, {i: doc['id'] for i, doc in enumerate(docs)})
+
+
+def load_paper(key, embeddings):
+    """
+    Returns (FigureIndex, vectorstore, SectionTree) for a cached paper, or None on a miss.
+    """
+    path = _entry_path(key)
+    if not has_paper(key) or not _private_dir():
+        return None
+
+    try:
+        vectorstore = _load_vectorstore(os.path.join(path, 'faiss'), embeddings)
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        caption_vectors = np.load(os.path.join(path, 'captions.npy'))
+        with open(os.path.join(path, 'sections.json')) as f:
+            sections = SectionTree(json.load(f))
+    except Exception:
+        shutil.rmtree(path, ignore_errors=True)
+        return None
+
+    if meta.get('format') != CACHE_FORMAT:
+        shutil.rmtree(path, ignore_errors=True)
+        return None
+
+    pdf_list = [[fig['figure'], fig['caption']] for fig in meta['figures']]
+
+    _touch(path)
+    return FigureIndex(pdf_list, caption_vectors), vectorstore, sections
+
+
+def save_paper(key, vectorstore, figures, sections):
+    """
+    Persists the FAISS index with its chunk documents, the parent sections, the
+    figure/caption list and the caption embeddings.
+    Writes into a staging directory first so readers never see half an entry.
+    """
+    if not _private_dir():
+        return
+    path = _entry_path(key)
+    staging = tempfile.mkdtemp(prefix='.staging-', dir=CACHE_DIR)
+
+    try:
+        _save_vectorstore(vectorstore, os.path.join(staging, 'faiss'))
+
+        # Figures are records into the PDF; their images are not stored
+        figure_meta = [{'figure': figure, 'caption': caption} for figure, caption in figures]
+        np.save(os.path.join(staging, 'captions.npy'), figures.vectors)
+        with open(os.path.join(staging, 'sections.json'), 'w') as f:
+            json.dump(sections.sections, f)
+
+        with open(os.path.join(staging, 'meta.json'), 'w') as f:
+            json.dump({'format': CACHE_FORMAT, 'created': time.time(), 'figures': figure_meta}, f)
+
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(staging, path)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    evict(keep=key)
+
+
+def load_digest(key):
+    try:
+        with open(os.path.join(_entry_path(key), 'digest.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_digest(key, digest):
+    """
+    Stores a paper digest next to its cached entry; a no-op when the paper
+    itself is not cached.
+    """
+    path = _entry_path(key)
+    if not has_paper(key):
+        return
+    staging = os.path.join(path, '.digest.json.tmp')
+    with open(staging, 'w') as f:
+        json.dump(digest, f)
+    os.replace(staging, os.path.join(path, 'digest.json'))
+
+
+def evict(keep=None, max_bytes=CACHE_MAX_BYTES):
+    """
+    Drops least recently used entries until the cache fits in max_bytes.
+    """
+    if not os.path.isdir(CACHE_DIR):
+        return
+
+    entries = []
+    for name in os.listdir(CACHE_DIR):
+        path = _entry_path(name)
+        if name.startswith('.') or not os.path.isdir(path):
+            continue
+        entries.append((os.path.getmtime(path), _dir_size(path), name))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        if name == keep:
+            continue
+        shutil.rmtree(_entry_path(name), ignore_errors=True)
+        total -= size
@@ -0,0 +1,148 @@
+import uuid
+import threading
+from langchain_core.documents import Document
+from langchain_community.vectorstores import FAISS
+from utils.figures import FigureIndex
+from utils.sections import SectionTree
+from utils.bm25 import BM25Index, reciprocal_rank_fusion
+from utils.tracing import traced
+
+
+def _with_section(doc):
+    section = doc.metadata.get("section")
+    return f"{section}\n{doc.page_content}" if section else doc.page_content
+
+
+class PaperIndex:
+    """
+    Everything retrieval needs for one paper: the FAISS store, a BM25 index
+    over the same chunks, the parent sections of those chunks and the
+    captioned figures.
+
+    The index can keep growing in a background thread while the chat already
+    queries it. Pages arrive in order as (chunks, figures) batches; searches
+    only see the pages indexed so far.
+    """
+
+    def __init__(self, embeddings, total_pages):
+        self.embeddings = embeddings
+        self.total_pages = total_pages
+        self.key = None  # paper cache key, set by the loader
+        self.pages_done = 0
+        self.figures = FigureIndex()
+        self.lexical = BM25Index()
+        self.sections = SectionTree()
+        self.vectorstore = None
+        self.error = None
+        self.done = threading.Event()
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore, figures, sections, embeddings):
+        """
+        Wraps a fully built FAISS store, e.g. one restored from the paper cache.
+        """
+        docs = list(vectorstore.docstore._dict.values())
+        total_pages = max((doc.metadata.get("total_pages", 0) for doc in docs), default=0)
+
+        index = cls(embeddings, total_pages)
+        index.vectorstore = vectorstore
+        index.figures = figures
+        index.sections = sections
+        index.lexical.add(docs, [_with_section(doc) for doc in docs])
+        index.pages_done = total_pages
+        index.done.set()
+        return index
+
+    @property
+    def progress(self):
+        return self.pages_done / self.total_pages if self.total_pages else 1.0
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @traced("index.add_batch")
+    def add_batch(self, chunks, figures, pages, paragraphs):
+        self.sections.add(chunks, paragraphs)
+
+        # Embedding happens outside the lock so searches are never blocked by it
+        if chunks:
+            ids = [str(uuid.uuid4()) for _ in chunks]
+            texts = [doc.page_content for doc in chunks]
+            metadatas = [doc.metadata for doc in chunks]
+            # Both retrievers see the section title; the docstore keeps the bare paragraph
+            with_section = [_with_section(doc) for doc in chunks]
+            vectors = self.embeddings.embed_documents(with_section)
+            pairs = list(zip(texts, vectors))
+
+            with self._lock:
+                if self.vectorstore is None:
+                    self.vectorstore = FAISS.from_embeddings(pairs, self.embeddings, metadatas=metadatas, ids=ids)
+                else:
+                    self.vectorstore.add_embeddings(pairs, metadatas=metadatas, ids=ids)
+                # Hits must be the same chunks the docstore returns, not the prefixed text
+                self.lexical.add(
+                    [Document(id=i, page_content=t, metadata=m) for i, t, m in zip(ids, texts, metadatas)],
+                    with_section,
+                )
+
+        self.figures.add(figures, self.embeddings)
+        self.pages_done += pages
+
+    def similarity_search(self, query, k=4, **kwargs):
+        with self._lock:
+            if self.vectorstore is None:
+                return []
+            return self.vectorstore.similarity_search(query, k=k, **kwargs)
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, **kwargs):
+        with self._lock:
+            if self.vectorstore is None:
+                return []
+            return self.vectorstore.similarity_search_with_score_by_vector(embedding, k=k, **kwargs)
+
+    def hybrid_search(self, query, embedding, k=4, k_vector=8, k_lexical=8, rrf_k=60):
+        """
+        Fuses the dense hits for `embedding` and the BM25 hits for `query`
+        with reciprocal-rank fusion. Returns (Document, fused score) pairs.
+        """
+        with self._lock:
+            if self.vectorstore is None:
+                return []
+            vector_hits = self.vectorstore.similarity_search_with_score_by_vector(embedding, k=k_vector)
+            lexical_hits = self.lexical.search(query, k=k_lexical) if k_lexical else []
+
+        fused = reciprocal_rank_fusion(
+            [[doc for doc, _ in vector_hits], [doc for doc, _ in lexical_hits]], k=rrf_k
+        )
+        return fused[:k]
+
+    def run(self, batches, on_complete=None):
+        """
+        Consumes an iterator of (chunks, figures, pages, paragraphs) in a daemon thread.
+        """
+        def worker():
+            try:
+                for chunks, figures, pages, paragraphs in batches:
+                    if self.cancelled:
+                        return
+                    self.add_batch(chunks, figures, pages, paragraphs)
+                if on_complete and self.vectorstore is not None:
+                    on_complete(self)
+            except Exception as e:
+                self.error = e
+            finally:
+                self.done.set()
+
+        threading.Thread(target=worker, daemon=True).start()
+        return self
+
+    def cancel(self):
+        self._cancelled.set()
+
+
+def cancel_indexing(vectorstore):
+    if isinstance(vectorstore, PaperIndex):
+        vectorstore.cancel()
@@ -0,0 +1,159 @@
+import os
+import weakref
+import threading
+from collections import OrderedDict
+from utils.paper_index import PaperIndex, cancel_indexing
+
+# Papers no session holds are evicted, least recently used first, above this
+PAPER_STORE_MAX_BYTES = int(os.getenv('PAPER_STORE_MAX_MB', '1024')) * 1024 * 1024
+
+
+class _Entry:
+    def __init__(self, index, pdf_bytes):
+        self.index = index
+        self.pdf_bytes = pdf_bytes
+        self.refs = 0
+        self.size = None  # resident bytes, once indexing has finished
+
+
+def _resident_bytes(entry):
+    """
+    Rough in-memory size of a paper: PDF bytes, chunk vectors and texts,
+    caption vectors. Computed once when indexing finishes; until then the
+    chunk texts are left out, they would have to be summed on every call.
+    Decoded figure images are bounded by their own cache in utils.figures
+    and are not counted.
+    """
+    if entry.size is not None:
+        return entry.size
+    index = entry.index
+    done = index.done.is_set()
+    size = len(entry.pdf_bytes) + index.figures.vectors.nbytes
+    vectorstore = index.vectorstore
+    if vectorstore is not None:
+        size += vectorstore.index.ntotal * vectorstore.index.d * 4
+        if done:
+            size += sum(len(doc.page_content) for doc in list(vectorstore.docstore._dict.values()))
+    if done:
+        entry.size = size
+    return size
+
+
+class PaperHandle:
+    """
+    A session's reference to a shared processed paper. Reads like the
+    PaperIndex it wraps, so retrieval takes either. Released explicitly on
+    release() or when the session that holds it is garbage collected.
+    """
+
+    def __init__(self, store, key, entry):
+        self.key = key
+        self.index = entry.index
+        self.figures = entry.index.figures
+        self.pdf_bytes = entry.pdf_bytes
+        self._release = weakref.finalize(self, store._release, key, entry)
+
+    def __getattr__(self, name):
+        if name == "index":
+            raise AttributeError(name)
+        return getattr(self.index, name)
+
+    def release(self):
+        self._release()
+
+
+class PaperStore:
+    """
+    Process-wide, reference-counted store of processed papers keyed by the
+    paper cache key (content hash plus processing parameters). Sessions
+    opening the same paper share one PaperIndex, figure list and copy of
+    the PDF bytes instead of each building their own.
+    """
+
+    def __init__(self, max_bytes=PAPER_STORE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        # Reentrant: a handle collected while the lock is held releases through it
+        self._lock = threading.RLock()
+
+    def acquire(self, key):
+        """
+        Returns a handle for key, or None when the paper is not resident.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.index.error or entry.index.cancelled:
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry.refs += 1
+            self._entries.move_to_end(key)
+            return PaperHandle(self, key, entry)
+
+    def put(self, key, index, pdf_bytes):
+        """
+        Stores a freshly processed paper and returns a handle to it. When
+        another session stored the same paper meanwhile, that one is shared.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.index.error or entry.index.cancelled:
+                # One immutable copy: the PDF viewer only accepts `bytes`, and
+                # sessions must not be able to change what others read
+                if type(pdf_bytes) is not bytes:
+                    pdf_bytes = bytes(pdf_bytes)
+                entry = self._entries[key] = _Entry(index, pdf_bytes)
+            elif entry.index is not index:
+                cancel_indexing(index)
+            entry.refs += 1
+            self._entries.move_to_end(key)
+            handle = PaperHandle(self, key, entry)
+            self._evict()
+            return handle
+
+    def _release(self, key, entry):
+        with self._lock:
+            entry.refs -= 1
+            if entry.refs <= 0 and not entry.index.done.is_set():
+                # Nobody is waiting for the rest of this paper any more
+                cancel_indexing(entry.index)
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+            self._evict()
+
+    def _evict(self):
+        resident = {key: _resident_bytes(entry) for key, entry in self._entries.items()}
+        total = sum(resident.values())
+        for key in list(self._entries):
+            if total <= self.max_bytes:
+                break
+            entry = self._entries.get(key)
+            if entry is not None and entry.refs <= 0:
+                del self._entries[key]
+                total -= resident[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "papers": len(self._entries),
+                "handles": sum(entry.refs for entry in self._entries.values()),
+                "resident_bytes": sum(_resident_bytes(entry) for entry in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+store = PaperStore()
+
+
+def release_paper(vectorstore):
+    """
+    Drops a session's hold on its paper; replaces cancel_indexing for
+    papers opened through the store.
+    """
+    if isinstance(vectorstore, PaperHandle):
+        vectorstore.release()
+    elif isinstance(vectorstore, PaperIndex):
+        cancel_indexing(vectorstore)
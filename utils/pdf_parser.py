@@ -0,0 +1,217 @@
+import re
+import fitz
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from langchain_core.documents import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+# Kept free of Streamlit and the embedding model so that process-pool
+# workers can import it cheaply.
+
+CHUNK_SIZE = 700
+CHUNK_OVERLAP = 100
+# Part of the paper cache key; bump whenever chunk boundaries change
+CHUNKER_VERSION = "sections-1"
+
+def split_documents(documents, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        add_start_index=True,  # lets context assembly merge overlapping chunks
+    )
+    return splitter.split_documents(documents)
+
+
+# Text only: images are located with get_image_info and decoded when shown
+TEXT_FLAGS = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+
+HEADING_SIZE_RATIO = 1.15
+MAX_HEADING_CHARS = 120
+MIN_PARAGRAPH_CHARS = 150
+
+# Numbered ("3", "3.2", "IV.", "A.") or well-known unnumbered section titles
+HEADING_RE = re.compile(
+    r"^((\d+(\.\d+)*|[IVX]+|[A-Z])\.?\s+\S|"
+    r"(abstract|introduction|background|related work|method(s|ology)?|experiments?|"
+    r"results|discussion|conclusions?|references|acknowledg(e)?ments|appendix)\b)",
+    re.IGNORECASE,
+)
+CAPTION_RE = re.compile(r"^(fig\.|figure|table)\s*\d", re.IGNORECASE)
+FIGURE_CAPTION_RE = re.compile(r"^(fig\.|figure)\s*\d", re.IGNORECASE)
+# Points a caption may overlap its image and still count as below or above it
+CAPTION_SLACK = 4
+
+
+def _is_heading(text, size, bold, body_size):
+    if not text or len(text) > MAX_HEADING_CHARS or text.endswith(".") or CAPTION_RE.match(text):
+        return False
+    if size >= body_size * HEADING_SIZE_RATIO:
+        return True
+    return bold and bool(HEADING_RE.match(text))
+
+
+def parse_page(page):
+    """
+    Parses one page with a single text-only get_text("dict") call. Returns
+    the text blocks as (text, is_heading) pairs in reading order and the
+    figure caption blocks as (bbox, text) pairs.
+    """
+    text_blocks, captions, mentions = [], [], []
+    size_chars = Counter()
+
+    for b in page.get_text("dict", flags=TEXT_FLAGS)["blocks"]:
+        if b["type"] != 0:
+            continue
+
+        spans = [span for line in b.get("lines", []) for span in line["spans"] if span["text"].strip()]
+        if not spans:
+            continue
+
+        text = "\n".join("".join(span["text"] for span in line["spans"]) for line in b["lines"]).strip()
+        size = max(span["size"] for span in spans)
+        bold = all(span["flags"] & 16 for span in spans)
+        text_blocks.append((text, size, bold))
+        for span in spans:
+            size_chars[round(span["size"] * 2) / 2] += len(span["text"])
+
+        flat = text.replace("\n", " ")
+        if FIGURE_CAPTION_RE.match(flat):
+            captions.append((tuple(b["bbox"]), flat))
+        elif "figure" in flat.lower() or "fig." in flat.lower():
+            mentions.append((tuple(b["bbox"]), flat))
+
+    # The most common font size by character count is taken as body text
+    body_size = size_chars.most_common(1)[0][0] if size_chars else 0.0
+    blocks = [(text, _is_heading(text, size, bold, body_size)) for text, size, bold in text_blocks]
+
+    # Without a proper "Figure N" caption, fall back to the first block mentioning a figure
+    return blocks, captions or mentions[:1]
+
+
+def _overlaps_horizontally(a, b):
+    return min(a[2], b[2]) - max(a[0], b[0]) > 0
+
+
+class CaptionIndex:
+    """
+    The caption blocks of one page, sorted once by top and by bottom edge,
+    so each image finds its nearest caption below or above by bisection
+    instead of rescanning every block.
+    """
+
+    def __init__(self, captions):
+        self.captions = captions
+        self.by_top = sorted(captions, key=lambda c: c[0][1])
+        self.tops = [bbox[1] for bbox, _ in self.by_top]
+        self.by_bottom = sorted(captions, key=lambda c: c[0][3])
+        self.bottoms = [bbox[3] for bbox, _ in self.by_bottom]
+
+    def nearest(self, bbox):
+        """
+        Caption text closest to an image bbox: the nearest caption in the same
+        column below or above it (below wins ties), else the nearest on the page.
+        """
+        below = above = None
+        for i in range(bisect_left(self.tops, bbox[3] - CAPTION_SLACK), len(self.by_top)):
+            if _overlaps_horizontally(self.by_top[i][0], bbox):
+                below = self.by_top[i]
+                break
+        for i in range(bisect_right(self.bottoms, bbox[1] + CAPTION_SLACK) - 1, -1, -1):
+            if _overlaps_horizontally(self.by_bottom[i][0], bbox):
+                above = self.by_bottom[i]
+                break
+
+        if below and above:
+            return below[1] if below[0][1] - bbox[3] <= bbox[1] - above[0][3] else above[1]
+        if below or above:
+            return (below or above)[1]
+
+        center = (bbox[1] + bbox[3]) / 2
+        return min(self.captions, key=lambda c: abs((c[0][1] + c[0][3]) / 2 - center))[1]
+
+
+def _figure_records(page, captions):
+    """
+    [figure, caption] pairs for the page's images, where figure is a
+    {"page", "xref", "bbox"} record and caption the nearest caption block;
+    the image itself is not decoded here. Pages without a caption are not
+    searched for images at all.
+    """
+    if not captions:
+        return []
+
+    index = CaptionIndex(captions)
+    return [
+        [{"page": page.number, "xref": info["xref"], "bbox": [round(v, 2) for v in info["bbox"]]}, index.nearest(info["bbox"])]
+        for info in page.get_image_info(xrefs=True)
+    ]
+
+
+def _chunk_paragraph(text, metadata, chunk_size, chunk_overlap):
+    if len(text) <= chunk_size:
+        return [Document(page_content=text, metadata=metadata)]
+
+    chunks = split_documents([Document(page_content=text, metadata=metadata)], chunk_size, chunk_overlap)
+    for chunk in chunks:
+        chunk.metadata["start_index"] += metadata["start_index"]
+    return chunks
+
+
+def parse_pages(doc, source, start, end, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    """
+    Parses and chunks pages [start, end) of an open document.
+
+    Returns (chunks, figures, paragraphs). paragraphs lists every text block
+    in order as {"text", "page", "heading"}; headings open a new section.
+    Chunks are paragraph-sized (short paragraphs are joined, long ones split),
+    never cross a heading or a page, and point back to their first paragraph
+    through metadata["paragraph"], an index into paragraphs.
+    """
+    chunks, images_with_captions, paragraphs = [], [], []
+
+    for page_number in range(start, end):
+        page = doc[page_number]
+        blocks, captions = parse_page(page)
+        images_with_captions.extend(_figure_records(page, captions))
+
+        offset, pending = 0, None  # pending: [text, start_index, paragraph index]
+
+        def flush():
+            if pending:
+                metadata = {
+                    "source": source,
+                    "page": page_number,
+                    "total_pages": len(doc),
+                    "start_index": pending[1],
+                    "paragraph": pending[2],
+                }
+                chunks.extend(_chunk_paragraph(pending[0], metadata, chunk_size, chunk_overlap))
+
+        for text, is_heading in blocks:
+            paragraphs.append({"text": text, "page": page_number, "heading": is_heading})
+
+            if is_heading:
+                flush()
+                pending = None
+            elif pending and len(pending[0]) < MIN_PARAGRAPH_CHARS:
+                pending[0] += "\n" + text
+            else:
+                flush()
+                pending = [text, offset, len(paragraphs) - 1]
+
+            offset += len(text) + 1  # blocks are joined by newlines in the page text
+
+        flush()
+
+    return chunks, images_with_captions, paragraphs
+
+
+def parse_range(pdf_path, source, page_range):
+    """
+    Process-pool entry point: opens the PDF file in the worker and parses
+    one contiguous page range. Only the path crosses the process boundary;
+    MuPDF reads just the objects of the pages it parses.
+    """
+    start, end = page_range
+    with fitz.open(pdf_path, filetype="pdf") as doc:
+        return parse_pages(doc, source, start, end)
@@ -0,0 +1,170 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import tempfile
+import functools
+import threading
+import unicodedata
+from contextlib import contextmanager
+
+SEARCH_CACHE_PATH = os.getenv('SEARCH_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'researchio_search.sqlite'))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', '5000'))
+# How long past its TTL an entry may still be served while it is refreshed
+SEARCH_CACHE_STALE_SECONDS = int(os.getenv('SEARCH_CACHE_STALE_SECONDS', str(7 * 24 * 3600)))
+
+# Google results also cost API quota, so they are kept the longest
+SOURCE_TTLS = {
+    "google": int(os.getenv('SEARCH_TTL_GOOGLE', str(24 * 3600))),
+    "open_access": int(os.getenv('SEARCH_TTL_OPEN_ACCESS', str(6 * 3600))),
+    "web": int(os.getenv('SEARCH_TTL_WEB', str(6 * 3600))),
+}
+# Results missing sources that failed or timed out are kept briefly and never served stale
+SEARCH_TTL_PARTIAL = int(os.getenv('SEARCH_TTL_PARTIAL', '300'))
+
+_init_lock = threading.Lock()
+_initialized = False
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def normalize_query(query):
+    query = unicodedata.normalize("NFKC", query).lower()
+    query = re.sub(r"[^\w\s.\-:]", " ", query)
+    return " ".join(query.split())
+
+
+def _connect():
+    global _initialized
+    conn = sqlite3.connect(SEARCH_CACHE_PATH, timeout=5)
+    if not _initialized:
+        with _init_lock:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "source TEXT, query TEXT, value TEXT, created REAL, accessed REAL, "
+                "PRIMARY KEY (source, query))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+            conn.commit()
+            _initialized = True
+    return conn
+
+
+@contextmanager
+def _db():
+    conn = _connect()
+    try:
+        with conn:  # commits on success
+            yield conn
+    finally:
+        conn.close()
+
+
+def get(source, query):
+    """
+    Returns (value, age in seconds) or None.
+    """
+    with _db() as conn:
+        row = conn.execute(
+            "SELECT value, created FROM results WHERE source = ? AND query = ?", (source, query)
+        ).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        conn.execute("UPDATE results SET accessed = ? WHERE source = ? AND query = ?", (now, source, query))
+    return json.loads(row[0]), now - row[1]
+
+
+def put(source, query, value):
+    now = time.time()
+    with _db() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+            (source, query, json.dumps(value), now, now),
+        )
+        # Drop entries too old to serve even stale, then least recently used overflow
+        max_ttl = max(SOURCE_TTLS.values())
+        conn.execute("DELETE FROM results WHERE created < ?", (now - max_ttl - SEARCH_CACHE_STALE_SECONDS,))
+        conn.execute(
+            "DELETE FROM results WHERE rowid IN ("
+            "SELECT rowid FROM results ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (SEARCH_CACHE_MAX_ENTRIES,),
+        )
+
+
+def _cacheable(value):
+    if isinstance(value, dict):
+        return value.get("status") != "error"
+    return bool(value)
+
+
+def _partial(value):
+    # A fan-out where some sources failed or timed out
+    sources = value.get("sources") if isinstance(value, dict) else None
+    return any(stat.get("error") for stat in (sources or {}).values())
+
+
+def _refresh(source, key, func, query):
+    with _refreshing_lock:
+        if (source, key) in _refreshing:
+            return
+        _refreshing.add((source, key))
+
+    def worker():
+        try:
+            value = func(query)
+            # A stale complete result beats a fresh partial one
+            if _cacheable(value) and not _partial(value):
+                put(source, key, value)
+        except Exception:
+            pass  # keep serving the stale value
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard((source, key))
+
+    threading.Thread(target=worker, daemon=True).start()
+
+
+def cached_search(source, ttl=None):
+    """
+    Caches a search function's results per source and normalized query.
+    Fresh hits are returned directly. Stale hits are returned immediately
+    while a background refresh runs. Error results are never cached, partial
+    ones only for SEARCH_TTL_PARTIAL.
+    """
+    ttl = SOURCE_TTLS.get(source, 3600) if ttl is None else ttl
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(query, *args, **kwargs):
+            if args or kwargs:
+                return func(query, *args, **kwargs)
+
+            key = normalize_query(query)
+            try:
+                hit = get(source, key)
+            except sqlite3.Error:
+                hit = None
+
+            if hit is not None:
+                value, age = hit
+                partial = _partial(value)
+                if age < (min(ttl, SEARCH_TTL_PARTIAL) if partial else ttl):
+                    return value
+                if not partial and age < ttl + SEARCH_CACHE_STALE_SECONDS:
+                    _refresh(source, key, func, query)
+                    return value
+
+            value = func(query)
+            if _cacheable(value):
+                try:
+                    put(source, key, value)
+                except sqlite3.Error:
+                    pass
+            return value
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,59 @@
+class SectionTree:
+    """
+    Parent sections of a paper's paragraph chunks. Each section's text is
+    stored once here; chunks only carry its id in metadata["section_id"].
+
+    Batches must be added in page order: a batch that starts mid-section
+    continues the last section of the previous batch.
+    """
+
+    FRONT_MATTER = "Front matter"
+
+    def __init__(self, sections=None):
+        self.sections = sections or {}
+        self._current = next(reversed(self.sections), None)
+
+    def __len__(self):
+        return len(self.sections)
+
+    def __contains__(self, section_id):
+        return section_id in self.sections
+
+    def _open(self, title, page):
+        section_id = f"sec-{len(self.sections)}"
+        self.sections[section_id] = {"title": title, "pages": [page], "paragraphs": []}
+        self._current = section_id
+
+    def add(self, chunks, paragraphs):
+        """
+        Files paragraphs under their sections and points each chunk at its
+        parent via metadata["section_id"] and metadata["section"].
+        """
+        section_ids = []
+        for paragraph in paragraphs:
+            if paragraph["heading"]:
+                self._open(paragraph["text"].replace("\n", " "), paragraph["page"])
+            else:
+                if self._current is None:
+                    self._open(self.FRONT_MATTER, paragraph["page"])
+                self.sections[self._current]["paragraphs"].append(paragraph["text"])
+
+            pages = self.sections[self._current]["pages"]
+            if pages[-1] != paragraph["page"]:
+                pages.append(paragraph["page"])
+            section_ids.append(self._current)
+
+        for chunk in chunks:
+            section_id = section_ids[chunk.metadata.pop("paragraph")]
+            chunk.metadata["section_id"] = section_id
+            chunk.metadata["section"] = self.sections[section_id]["title"]
+
+    def title(self, section_id):
+        return self.sections[section_id]["title"]
+
+    def text(self, section_id):
+        section = self.sections[section_id]
+        return "\n".join([section["title"], *section["paragraphs"]])
+
+    def pages(self, section_id):
+        return self.sections[section_id]["pages"]
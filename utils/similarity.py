@@ -12,14 +12,22 @@ def select_relevant_papers(all_metadata, similarity_threshold: float = 0.96):
     except json.JSONDecodeError:
         all_metadata = ast.literal_eval(all_metadata)
 
-    user_query = all_metadata['query']
-    papers = all_metadata['candidates']
+    return rank_papers(all_metadata['query'], all_metadata['candidates'], similarity_threshold)
 
+
+def rank_papers(user_query, papers, similarity_threshold: float = 0.96):
+    """
+    Ranks candidate papers by title similarity to the query. Returns the
+    single match above similarity_threshold, else up to 3 papers within
+    0.1 of the best score.
+    """
     all_titles = []
     title_to_info = {}
     seen = set()
 
     for paper in papers:
+        if not paper.get("title") or not paper.get("pdf_link"):
+            continue
         title = paper["title"].strip().replace("\n", " ")
         key = (title.lower(), paper["pdf_link"])
         if key in seen:
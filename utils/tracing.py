@@ -0,0 +1,318 @@
+import os
+import json
+import queue
+import time
+import uuid
+import tempfile
+import functools
+import threading
+import contextvars
+from collections import deque, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Off by default; when off, span() is a shared no-op and @traced returns the function unchanged
+TRACE_ENABLED = os.getenv('TRACE_ENABLED', 'false').lower() == 'true'
+# Finished spans are appended here as JSON lines; empty to keep them in memory only
+TRACE_FILE = os.getenv('TRACE_FILE', os.path.join(tempfile.gettempdir(), 'researchio_trace.jsonl'))
+# Past this size the file is rotated to TRACE_FILE.1, replacing the previous one
+TRACE_FILE_MAX_BYTES = int(os.getenv('TRACE_FILE_MAX_MB', '50')) * 1024 * 1024
+# Serves Prometheus text on /metrics and recent spans on /spans when set
+TRACE_METRICS_PORT = int(os.getenv('TRACE_METRICS_PORT', '0'))
+TRACE_BUFFER = int(os.getenv('TRACE_BUFFER', '1000'))
+# Samples kept per span name for the percentiles of the debug panel
+TRACE_SAMPLES = 200
+
+HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_current = contextvars.ContextVar("span", default=None)
+_lock = threading.Lock()
+_recent = deque(maxlen=TRACE_BUFFER)
+_samples = defaultdict(lambda: deque(maxlen=TRACE_SAMPLES))
+# name -> [count, sum of seconds, errors, per-bucket counts]
+_totals = {}
+# Finished spans waiting for the file writer; dropped rather than blocking when full
+_pending = queue.Queue(maxsize=10000)
+_writer = None
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    """
+    A timed stage. Spans opened inside another one on the same thread (or
+    context) become its children and share its trace id.
+    """
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.span_id = uuid.uuid4().hex[:16]
+        self.trace_id = None
+        self.parent_id = None
+        self.duration = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        parent = _current.get()
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self._token = _current.set(self)
+        self.wall = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self._start
+        _current.reset(self._token)
+        if exc_type is not None and issubclass(exc_type, Exception):
+            self.attrs["error"] = f"{exc_type.__name__}: {exc}"
+        elif exc_type is not None:
+            # Control flow, not failures: a closed stream (GeneratorExit) or
+            # Streamlit stopping or rerunning the script when the user interrupts
+            self.attrs["interrupted"] = exc_type.__name__
+        _finish(self.record())
+        return False
+
+    def record(self):
+        return {
+            "name": self.name,
+            "trace": self.trace_id,
+            "span": self.span_id,
+            "parent": self.parent_id,
+            "start": self.wall,
+            "duration_ms": round(self.duration * 1000, 3),
+            **self.attrs,
+        }
+
+
+def _finish(record):
+    seconds = record["duration_ms"] / 1000
+    with _lock:
+        _recent.append(record)
+        _samples[record["name"]].append(seconds)
+        totals = _totals.setdefault(record["name"], [0, 0.0, 0, [0] * len(HISTOGRAM_BUCKETS)])
+        totals[0] += 1
+        totals[1] += seconds
+        totals[2] += "error" in record
+        for i, bound in enumerate(HISTOGRAM_BUCKETS):
+            if seconds <= bound:
+                totals[3][i] += 1
+
+    if TRACE_FILE:
+        _start_writer()
+        try:
+            _pending.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+def _start_writer():
+    global _writer
+    if _writer is None:
+        with _lock:
+            if _writer is None:
+                _writer = threading.Thread(target=_write_spans, name="trace-writer", daemon=True)
+                _writer.start()
+
+
+def _write_spans():
+    """
+    Appends queued spans to TRACE_FILE through one open handle, flushing
+    when the queue runs dry and rotating the file past TRACE_FILE_MAX_BYTES.
+    """
+    f = path = None
+    while True:
+        record = _pending.get()
+        try:
+            if f is not None and path != TRACE_FILE:
+                f.close()
+                f = None
+            if f is None:
+                path = TRACE_FILE
+                f = open(path, 'a')
+            f.write(json.dumps(record, default=str) + "\n")
+            if _pending.empty():
+                f.flush()
+            if f.tell() > TRACE_FILE_MAX_BYTES:
+                f.close()
+                f = None
+                os.replace(path, path + ".1")
+        except OSError:
+            if f is not None:
+                f.close()
+            f = None
+
+
+def span(name, **attrs):
+    """
+    Context manager timing one stage: `with span("retrieve", k=4) as s: ... s.set(hits=3)`.
+    """
+    if not TRACE_ENABLED:
+        return _NOOP
+    return Span(name, attrs)
+
+
+def traced(name=None):
+    """
+    Decorator recording every call of a function as a span.
+    """
+    def decorator(func):
+        if not TRACE_ENABLED:
+            return func
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with Span(span_name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record(name, seconds, **attrs):
+    """
+    Records a stage that was already timed elsewhere as a child of the current span.
+    """
+    if not TRACE_ENABLED:
+        return
+    parent = _current.get()
+    _finish({
+        "name": name,
+        "trace": parent.trace_id if parent else uuid.uuid4().hex[:16],
+        "span": uuid.uuid4().hex[:16],
+        "parent": parent.span_id if parent else None,
+        "start": time.time() - seconds,
+        "duration_ms": round(seconds * 1000, 3),
+        **attrs,
+    })
+
+
+def trace_stream(name, chunks):
+    """
+    Wraps a token stream; the span records time to first token and the
+    number of chunks besides the total generation time.
+    """
+    if not TRACE_ENABLED:
+        return chunks
+    return _traced_stream(name, chunks)
+
+
+def _traced_stream(name, chunks):
+    with Span(name, {}) as s:
+        start, count = time.perf_counter(), 0
+        try:
+            for chunk in chunks:
+                if not count:
+                    s.set(ttft_ms=round((time.perf_counter() - start) * 1000, 3))
+                count += 1
+                yield chunk
+        finally:
+            s.set(chunks=count)
+
+
+def recent_spans(limit=100, trace=None):
+    with _lock:
+        spans = [r for r in _recent if trace is None or r["trace"] == trace]
+    return spans[-limit:]
+
+
+def stage_stats():
+    """
+    [{name, count, mean_ms, p50_ms, p95_ms, max_ms, errors}] over recent samples, slowest p95 first.
+    """
+    with _lock:
+        samples = {name: sorted(values) for name, values in _samples.items()}
+        errors = {name: totals[2] for name, totals in _totals.items()}
+    rows = []
+    for name, values in samples.items():
+        n = len(values)
+        rows.append({
+            "name": name,
+            "count": n,
+            "mean_ms": round(sum(values) / n * 1000, 1),
+            "p50_ms": round(values[n // 2] * 1000, 1),
+            "p95_ms": round(values[min(int(n * 0.95), n - 1)] * 1000, 1),
+            "max_ms": round(values[-1] * 1000, 1),
+            "errors": errors.get(name, 0),
+        })
+    return sorted(rows, key=lambda row: row["p95_ms"], reverse=True)
+
+
+def prometheus_text():
+    """
+    All spans since startup as a Prometheus histogram, in the text exposition format.
+    """
+    lines = [
+        "# HELP researchio_stage_seconds Duration of traced stages.",
+        "# TYPE researchio_stage_seconds histogram",
+    ]
+    with _lock:
+        totals = {name: (count, total, errors, list(buckets)) for name, (count, total, errors, buckets) in _totals.items()}
+    for name, (count, total, _, buckets) in sorted(totals.items()):
+        label = name.replace("\\", "\\\\").replace('"', '\\"')
+        for bound, observed in zip(HISTOGRAM_BUCKETS, buckets):
+            lines.append(f'researchio_stage_seconds_bucket{{stage="{label}",le="{bound}"}} {observed}')
+        lines.append(f'researchio_stage_seconds_bucket{{stage="{label}",le="+Inf"}} {count}')
+        lines.append(f'researchio_stage_seconds_sum{{stage="{label}"}} {total:.6f}')
+        lines.append(f'researchio_stage_seconds_count{{stage="{label}"}} {count}')
+
+    lines += ["# HELP researchio_stage_errors_total Traced stages that raised.", "# TYPE researchio_stage_errors_total counter"]
+    for name, (_, _, errors, _) in sorted(totals.items()):
+        label = name.replace("\\", "\\\\").replace('"', '\\"')
+        lines.append(f'researchio_stage_errors_total{{stage="{label}"}} {errors}')
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = prometheus_text(), "text/plain; version=0.0.4"
+        elif self.path == "/spans":
+            body, content_type = "".join(json.dumps(r, default=str) + "\n" for r in recent_spans(TRACE_BUFFER)), "application/x-ndjson"
+        else:
+            self.send_error(404)
+            return
+        body = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+_server = None
+
+
+def serve_metrics(port=TRACE_METRICS_PORT):
+    """
+    Starts the local metrics endpoint once per process; a no-op when tracing
+    is off or no port is configured.
+    """
+    global _server
+    if not TRACE_ENABLED or not port:
+        return None
+    with _lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer(("127.0.0.1", port), _MetricsHandler)
+            except OSError:
+                return None  # another process of the app already serves it
+            threading.Thread(target=_server.serve_forever, name="trace-metrics", daemon=True).start()
+    return _server